@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import users, products, cart, orders, banners, offers, campaigns, reviews, promotions, home, items, auth
+from app.api.endpoints import users, products, cart, orders, banners, offers, campaigns, reviews, promotions, home, items, auth, categories
 
 api_router = APIRouter()
 
@@ -23,6 +23,7 @@ api_router.include_router(home.router, prefix="/app/home", tags=["home"])
 
 # Items/Products search and details
 api_router.include_router(items.router, prefix="/items", tags=["items"])
+api_router.include_router(categories.router, prefix="/categories", tags=["categories"])
 
 # Marketing related routes
 api_router.include_router(banners.router, prefix="/banners", tags=["banners"])
@@ -1,72 +1,37 @@
-from typing import Any, List
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
 
-router = APIRouter()
+from app.core import http_cache
+from app.core.precompressed import payload_response
+from app.db.database import get_db
+from app.services.banner_store import banner_store
 
-# Static banner data
-BANNERS = [
-    {
-        "bannerId": 1,
-        "name": "S. Ramakrishnan Books",
-        "imageUrl": "https://assets2.panuval.com/image/cache/catalog/0001_WritersPosters/S.Ramakrishnan%20Books-300x300.jpg",
-        "linkType": "SEARCH_FILTER",
-        "itemId": None,
-        "searchFilter": "authorId=123",
-        "dateAdded": datetime.now().isoformat()
-    },
-    {
-        "bannerId": 2,
-        "name": "Periyar Books",
-        "imageUrl": "https://assets2.panuval.com/image/cache/catalog/0001_WritersPosters/Periyar%20Books-300x300.jpg",
-        "linkType": "SEARCH_FILTER",
-        "itemId": None,
-        "searchFilter": "authorId=456",
-        "dateAdded": datetime.now().isoformat()
-    },
-    {
-        "bannerId": 3,
-        "name": "Balakumaran Books",
-        "imageUrl": "https://assets2.panuval.com/image/cache/catalog/0001_WritersPosters/Balakumaran%20Books-300x300.jpg",
-        "linkType": "SEARCH_FILTER",
-        "itemId": None,
-        "searchFilter": "authorId=789",
-        "dateAdded": datetime.now().isoformat()
-    },
-    {
-        "bannerId": 4,
-        "name": "Jeyamohan Books",
-        "imageUrl": "https://assets2.panuval.com/image/cache/catalog/0001_WritersPosters/Jeyamohan%20Books-300x300.jpg",
-        "linkType": "SEARCH_FILTER",
-        "itemId": None,
-        "searchFilter": "authorId=101",
-        "dateAdded": datetime.now().isoformat()
-    },
-    {
-        "bannerId": 5,
-        "name": "Tolstoy Books",
-        "imageUrl": "https://assets2.panuval.com/image/cache/catalog/0001_WritersPosters/Tolstoy%20Books-300x300.jpg",
-        "linkType": "SEARCH_FILTER",
-        "itemId": None,
-        "searchFilter": "authorId=202",
-        "dateAdded": datetime.now().isoformat()
-    }
-]
+router = APIRouter()
 
 @router.get("/")
-def get_all_banners() -> Any:
+def get_all_banners(request: Request, db: Session = Depends(get_db)) -> Any:
     """
     Retrieve all active banners
+
+    Served from the per-worker banner snapshot as pre-encoded bytes.
     """
-    return BANNERS
+    try:
+        return payload_response(request, banner_store.snapshot(db).payload, http_cache.BANNERS)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving banners: {str(e)}")
 
 @router.get("/{banner_id}")
-def get_banner_by_id(banner_id: int) -> Any:
+def get_banner_by_id(banner_id: int, request: Request, db: Session = Depends(get_db)) -> Any:
     """
     Get a specific banner by ID
     """
-    for banner in BANNERS:
-        if banner["bannerId"] == banner_id:
-            return banner
-            
-    raise HTTPException(status_code=404, detail="Banner not found")
\ No newline at end of file
+    try:
+        payload = banner_store.snapshot(db).payloads.get(banner_id)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Banner not found")
+        return payload_response(request, payload, http_cache.BANNERS)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving banner: {str(e)}")
@@ -1,34 +1,36 @@
-from typing import Any, List
+from typing import Any
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import schemas
+from app.core import http_cache
+from app.core.precompressed import payload_response
 from app.db.database import get_db
 from app.core.security import oauth2_scheme
+from app.services.active_windows import campaign_index
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 def get_active_campaigns(
+    request: Request,
     db: Session = Depends(get_db)
 ) -> Any:
     """
     Retrieve all active marketing campaigns
+
+    A campaign is active while its status is set and the current time is
+    within its start and end dates. Answered from the in-memory campaign
+    index; Cache-Control never outlives the next campaign start or end.
     """
-    campaigns = db.query(models.Campaign).filter(models.Campaign.status == 1).all()
-    
-    result = []
-    for campaign in campaigns:
-        result.append({
-            "campaign_id": campaign.campaign_id,
-            "title": campaign.title,
-            "start_date": campaign.start_date,
-            "end_date": campaign.end_date,
-            "status": campaign.status
-        })
-    
-    return result
+    try:
+        now = datetime.now()
+        payload, next_change = campaign_index.active(db, now)
+        return payload_response(request, payload, http_cache.PROMOTIONS.until(next_change, now))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving campaigns: {str(e)}")
 
 @router.get("/{campaign_id}", response_model=dict)
 def get_campaign_by_id(
@@ -38,17 +40,9 @@ def get_campaign_by_id(
     """
     Get a specific campaign by ID
     """
-    campaign = db.query(models.Campaign).filter(
-        models.Campaign.campaign_id == campaign_id
-    ).first()
+    campaign = campaign_index.get(db, campaign_id)
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    return {
-        "campaign_id": campaign.campaign_id,
-        "title": campaign.title,
-        "start_date": campaign.start_date,
-        "end_date": campaign.end_date,
-        "status": campaign.status
-    }
\ No newline at end of file
+    return campaign
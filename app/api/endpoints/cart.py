@@ -1,12 +1,14 @@
 from typing import Any, List
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer
 
 from app import models, schemas
 from app.db.database import get_db
 from app.core.security import oauth2_scheme
+from app.services.pricing import pricing_engine
 
 router = APIRouter()
 
@@ -24,22 +26,37 @@ def get_cart(
     
     cart_items = db.query(models.CartItem).filter(models.CartItem.customer_id == user_id).all()
     
+    # Load every product in the cart in one query and price them as a batch
+    product_ids = [item.product_id for item in cart_items]
+    products = {}
+    if product_ids:
+        products = {
+            product.product_id: (product, name)
+            for product, name in db.query(models.Product, models.ProductDescription.name).outerjoin(
+                models.ProductDescription,
+                and_(
+                    models.Product.product_id == models.ProductDescription.product_id,
+                    models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+                )
+            ).filter(models.Product.product_id.in_(product_ids))
+        }
+    prices = pricing_engine.resolve(
+        ((product.product_id, product.price) for product, _ in products.values()), db=db
+    )
+    
     items = []
     total_price = 0
     
     for item in cart_items:
-        product = db.query(models.Product).filter(models.Product.product_id == item.product_id).first()
-        if product:
-            product_description = db.query(models.ProductDescription).filter(
-                models.ProductDescription.product_id == item.product_id
-            ).first()
+        if item.product_id in products:
+            _, name = products[item.product_id]
             
-            price = float(product.price)
+            price = prices[item.product_id].price
             item_total = price * item.quantity
             
             items.append({
                 "product_id": item.product_id,
-                "name": product_description.name if product_description else "Product",
+                "name": name or "Product",
                 "quantity": item.quantity,
                 "price": str(price),
                 "total_price": str(item_total)
@@ -0,0 +1,74 @@
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from sqlalchemy.orm import Session
+
+from app.core import http_cache
+from app.core.http_cache import make_etag, not_modified, set_cache_headers
+from app.db.database import get_db
+from app.services.category_tree import category_tree
+
+router = APIRouter()
+
+@router.get("/tree")
+def get_category_tree(
+    request: Request,
+    response: Response,
+    root_id: Optional[int] = Query(None, description="Only return the subtree below this category"),
+    depth: Optional[int] = Query(None, ge=0, description="Levels of children to include (all if omitted)"),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get the category hierarchy with active product counts per category.
+    
+    Served from the in-memory category tree; productCount counts distinct
+    active products in the category and all its subcategories.
+    """
+    try:
+        if not category_tree.ready:
+            category_tree.refresh(db)
+        etag = make_etag("categories", root_id, depth, category_tree.fingerprint)
+        unchanged = not_modified(request, etag, http_cache.CATEGORIES)
+        if unchanged is not None:
+            return unchanged
+        tree = category_tree.tree(root_id, depth)
+        if tree is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        set_cache_headers(response, http_cache.CATEGORIES, etag)
+        return tree
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving category tree: {str(e)}")
+
+@router.get("/{category_id}")
+def get_category(
+    request: Request,
+    response: Response,
+    category_id: int = Path(..., description="The ID of the category to retrieve"),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get a category with its breadcrumb path and direct children.
+    """
+    try:
+        if not category_tree.ready:
+            category_tree.refresh(db)
+        etag = make_etag("category", category_id, category_tree.fingerprint)
+        unchanged = not_modified(request, etag, http_cache.CATEGORIES)
+        if unchanged is not None:
+            return unchanged
+        node = category_tree.node(category_id)
+        if node is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        category = category_tree.to_dict(node, max_depth=1)
+        category["breadcrumbs"] = [
+            {"id": crumb.category_id, "name": crumb.name, "searchFilter": f"categoryId={crumb.category_id}"}
+            for crumb in category_tree.breadcrumbs(category_id)
+        ]
+        set_cache_headers(response, http_cache.CATEGORIES, etag)
+        return category
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving category: {str(e)}")
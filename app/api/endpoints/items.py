@@ -1,17 +1,76 @@
-from typing import Any, List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import and_, func, or_, select
 
 from app import models, schemas
+from app.core import http_cache
+from app.core.config import settings
+from app.core.fields import Fields, parse_fields, project
+from app.core.http_cache import make_etag, not_modified, set_cache_headers
+from app.core.pagination import decode_cursor, encode_cursor, keyset_after
 from app.db.database import get_db
 from app.schemas.layout import ItemDetail, ItemSearchResponse
+from app.services.catalog_version import catalog_version
+from app.services.category_tree import category_tree
+from app.services.count_cache import count_total, filter_signature
+from app.services.facet_index import FacetFilters, facet_index
+from app.services.item_cards import item_cards
+from app.services.item_details import DETAIL_FIELDS, item_validators, load_item_details, resolve_product_ids
+from app.services.one_items import one_items_map
+from app.services.pricing import pricing_engine
+from app.services.related_items import TOP_N as RELATED_TOP_N, related_items
+from app.services.search_index import search_index
+from app.services.suggest_index import TOP_K, Suggestion, suggest_index
 
 router = APIRouter()
 
+# sort_by -> (sort column, descending). Every ordering is made total with
+# product_id as the tiebreaker so it can be paged with a keyset cursor.
+SEARCH_SORTS = {
+    "price_asc": (models.Product.price, False),
+    "price_desc": (models.Product.price, True),
+    "name_asc": (func.coalesce(models.ProductDescription.name, ""), False),
+    "name_desc": (func.coalesce(models.ProductDescription.name, ""), True),
+    "year_newest": (models.Product.date_added, True),
+    "year_oldest": (models.Product.date_added, False),
+    "best_sellers": (models.Product.viewed, True),
+}
+# "relevance" without a keyword the index can rank: newest first
+DEFAULT_SEARCH_SORT = (models.Product.date_added, True)
+# Type of the sort value in a keyset cursor, per sort_by (default: DEFAULT_SEARCH_SORT's)
+SEARCH_KEY_TYPES = {
+    "price_asc": (Decimal, int, float),
+    "price_desc": (Decimal, int, float),
+    "name_asc": str,
+    "name_desc": str,
+    "year_newest": datetime,
+    "year_oldest": datetime,
+    "best_sellers": int,
+}
+# Fields each search result can be narrowed to with fields=
+SEARCH_FIELDS = (
+    "itemId", "name", "imageUrl", "price", "originalPrice", "discountPercentage", "stockStatus", "label"
+)
+
+def _like_escape(text: str) -> str:
+    # Typed text is matched literally, so LIKE wildcards in it are escaped
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _items_etag(db: Session, kind: str, item_ids: List[int], items: Dict[int, int], fields: Fields) -> Optional[str]:
+    # Built from each item's version, stock, label and price rather than
+    # from the payload, so it is cheap once the payloads are cached
+    validators = item_validators(db, items)
+    if not validators:
+        return None
+    return make_etag(kind, item_ids, sorted(fields) if fields is not None else None, sorted(validators.items()))
+
 @router.get("/search")
 def search_items(
+    request: Request,
+    response: Response,
     q: Optional[str] = Query(None, description="Search keyword"),
     category_id: Optional[List[str]] = Query(None, description="Filter by category IDs"),
     author_id: Optional[List[str]] = Query(None, description="Filter by author IDs"),
@@ -22,54 +81,140 @@ def search_items(
     sort_by: str = Query("relevance", description="Sort criteria"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous response's pagination.nextCursor; takes precedence over page"),
+    count_mode: str = Query("exact", regex="^(exact|estimate)$", description="'estimate' caps the total for very broad queries"),
+    include_facets: bool = Query(False, description="Include category, author, publisher, price band and stock counts"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return per item (all if omitted)"),
     db: Session = Depends(get_db)
 ) -> Any:
     """
     Search and filter items with pagination and sorting.
+    
+    The ETag is derived from the request parameters and the signatures of
+    everything a page is built from (catalog, item cards, pricing, the
+    search, facet and category snapshots, and the view total when sorting
+    by best sellers), so an unchanged page is answered with 304 before any
+    query runs. It is only issued once the catalog and prices have been
+    polled.
+    
+    Result items are cards from the item card store, so the page query
+    selects nothing but product ids; fields= narrows each card.
     """
     try:
-        # Calculate offset for pagination
-        offset = (page - 1) * page_size
+        selected = parse_fields(fields, SEARCH_FIELDS, always=["itemId"])
+        
+        etag = None
+        pricing_signature = pricing_engine.signature()
+        if catalog_version.signature is not None and pricing_signature is not None:
+            etag = make_etag(
+                "search",
+                sorted(request.query_params.multi_items()),
+                catalog_version.signature,
+                # Views change on every product page view; only this sort depends on them
+                catalog_version.activity[1] if sort_by == "best_sellers" and catalog_version.activity else None,
+                pricing_signature,
+                search_index.signature if q and settings.SEARCH_INDEX_ENABLED else None,
+                # Facets, and relevance over match sets too large for SQL, read the facet index
+                facet_index.signature if include_facets or (q and sort_by == "relevance") else None,
+                category_tree.fingerprint if category_id else None,
+                item_cards.signature,
+                len(one_items_map)
+            )
+        unchanged = not_modified(request, etag, http_cache.ITEM_LISTING)
+        if unchanged is not None:
+            return unchanged
+        
+        # Resolve the page position. A cursor carries the last row's sort key
+        # so deep pages seek instead of skipping; page keeps working for older
+        # app versions.
+        keyset = None
+        cursor_total = None
+        if cursor:
+            position = decode_cursor(cursor, sort_by, key_types=(SEARCH_KEY_TYPES.get(sort_by, datetime), int))
+            page = position["p"]
+            keyset = position.get("k")
+            offset = position.get("o", (page - 1) * page_size)
+            cursor_total = position.get("t")
+        else:
+            offset = (page - 1) * page_size
         
-        # Start with base query for active products
+        # Start with base query for active products. The description join is
+        # pinned to the default language so each product yields exactly one row.
         query = db.query(models.Product).join(
-            models.ProductDescription, 
-            models.Product.product_id == models.ProductDescription.product_id
+            models.ProductDescription,
+            and_(
+                models.Product.product_id == models.ProductDescription.product_id,
+                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+            )
         ).filter(models.Product.status == 1)
         
-        # Apply keyword search if provided
+        # Apply keyword search if provided. The in-memory index answers when it
+        # is built and the match set is small enough to pass as an IN list;
+        # otherwise fall back to the predicate scan.
+        use_index = False
+        matched_ids = None
+        fuzzy = False
         if q:
-            search_term = f"%{q}%"
+            matched_ids = search_index.search(q) if settings.SEARCH_INDEX_ENABLED else None
+            # Misspelt or romanised keywords match nothing exactly; retry by
+            # spelling and transliteration similarity before returning nothing
+            if matched_ids is not None and not matched_ids:
+                matched_ids = search_index.search(q, fuzzy=True)
+                fuzzy = bool(matched_ids)
+            if matched_ids is not None and len(matched_ids) <= settings.SEARCH_INDEX_MAX_CANDIDATES:
+                use_index = True
+                query = query.filter(models.Product.product_id.in_(matched_ids))
+            else:
+                search_term = f"%{q}%"
+                query = query.filter(
+                    or_(
+                        models.ProductDescription.name.ilike(search_term),
+                        models.ProductDescription.description.ilike(search_term),
+                        models.ProductDescription.meta_keyword.ilike(search_term),
+                        models.Product.model.ilike(search_term),
+                        models.Product.sku.ilike(search_term)
+                    )
+                )
+        
+        # Apply category, author and publisher filters if provided. A category
+        # also matches everything in its subtree. Semi-joins keep products
+        # linked to several of the selected values from being returned twice.
+        category_ids = category_tree.expand(int(cid) for cid in category_id) if category_id else None
+        author_ids = {int(aid) for aid in author_id} if author_id else None
+        publisher_ids = {int(pid) for pid in publisher_id} if publisher_id else None
+        if category_ids:
             query = query.filter(
-                or_(
-                    models.ProductDescription.name.ilike(search_term),
-                    models.ProductDescription.description.ilike(search_term),
-                    models.ProductDescription.meta_keyword.ilike(search_term),
-                    models.Product.model.ilike(search_term),
-                    models.Product.sku.ilike(search_term)
+                models.Product.product_id.in_(
+                    select(models.ProductToCategory.product_id).where(
+                        models.ProductToCategory.category_id.in_(category_ids)
+                    )
+                )
+            )
+        if author_ids:
+            query = query.filter(
+                models.Product.product_id.in_(
+                    select(models.ProductAuthor.product_id).where(
+                        models.ProductAuthor.author_id.in_(author_ids)
+                    )
+                )
+            )
+        if publisher_ids:
+            query = query.filter(
+                models.Product.product_id.in_(
+                    select(models.ProductPublisher.product_id).where(
+                        models.ProductPublisher.publisher_id.in_(publisher_ids)
+                    )
                 )
             )
         
-        # Apply category filter if provided
-        if category_id:
-            query = query.join(
-                models.ProductToCategory,
-                models.Product.product_id == models.ProductToCategory.product_id
-            ).filter(models.ProductToCategory.category_id.in_([int(cid) for cid in category_id]))
-            
-        # Apply author filter if provided (commented out until tables exist)
-        # if author_id:
-        #     query = query.join(
-        #         models.ProductAuthor,
-        #         models.Product.product_id == models.ProductAuthor.product_id
-        #     ).filter(models.ProductAuthor.author_id.in_([int(aid) for aid in author_id]))
-            
-        # Apply publisher filter if provided (commented out until tables exist)
-        # if publisher_id:
-        #     query = query.join(
-        #         models.ProductPublisher,
-        #         models.Product.product_id == models.ProductPublisher.product_id
-        #     ).filter(models.ProductPublisher.publisher_id.in_([int(pid) for pid in publisher_id]))
+        facet_filters = FacetFilters(
+            category_ids=category_ids,
+            author_ids=author_ids,
+            publisher_ids=publisher_ids,
+            price_min=price_min,
+            price_max=price_max,
+            in_stock_only=exclude_out_of_stock
+        )
         
         # Apply price filters if provided
         if price_min is not None:
@@ -81,87 +226,93 @@ def search_items(
         if exclude_out_of_stock:
             query = query.filter(models.Product.quantity > 0)
         
-        # Apply sorting
-        if sort_by == "price_asc":
-            query = query.order_by(models.Product.price.asc())
-        elif sort_by == "price_desc":
-            query = query.order_by(models.Product.price.desc())
-        elif sort_by == "name_asc":
-            query = query.order_by(models.ProductDescription.name.asc())
-        elif sort_by == "name_desc":
-            query = query.order_by(models.ProductDescription.name.desc())
-        elif sort_by == "year_newest":
-            query = query.order_by(models.Product.date_added.desc())
-        elif sort_by == "year_oldest":
-            query = query.order_by(models.Product.date_added.asc())
-        # For "relevance" and "best_sellers", default to most viewed or recently added
+        # Relevance ranking needs the index's term weights, so the filtered
+        # candidate ids are fetched and only the requested page is ranked.
+        # A match set too large for an IN list is filtered in memory by the
+        # facet index instead of falling back to the predicate scan's order.
+        ranked_ids = None
+        total_is_estimate = False
+        candidate_ids = None
+        if sort_by == "relevance" and matched_ids is not None:
+            if use_index:
+                candidate_ids = [row.product_id for row in query.with_entities(models.Product.product_id)]
+            else:
+                candidate_ids = facet_index.matching(matched_ids, facet_filters)
+        if candidate_ids is not None:
+            total_count = len(candidate_ids)
+            ranked_ids = search_index.rank(q, candidate_ids, offset + page_size, fuzzy=fuzzy)[offset:]
+        elif cursor_total is not None:
+            # Later pages reuse the total counted for the first one
+            total_count = cursor_total
         else:
-            if sort_by == "best_sellers":
-                query = query.order_by(models.Product.viewed.desc())
-            else:  # Default sorting is by date added (newest first)
-                query = query.order_by(models.Product.date_added.desc())
+            signature = filter_signature(
+                "search",
+                q=q,
+                use_index=use_index,
+                category_id=category_ids,
+                author_id=author_id,
+                publisher_id=publisher_id,
+                price_min=price_min,
+                price_max=price_max,
+                exclude_out_of_stock=exclude_out_of_stock
+            )
+            total_count, total_is_estimate = count_total(
+                query, models.Product.product_id, signature, count_mode
+            )
         
-        # Get total count for pagination
-        total_count = query.count()
+        # The page query only picks product ids; the cards are read from the
+        # item card store. The sort key is projected so the next cursor can
+        # be built from the last row.
+        sort_column, descending = SEARCH_SORTS.get(sort_by, DEFAULT_SEARCH_SORT)
+        query = query.with_entities(models.Product.product_id, sort_column.label("sort_key"))
         
-        # Apply pagination
-        items = query.offset(offset).limit(page_size).all()
+        # Apply sorting, with product_id as the tiebreaker so the order is total
+        if descending:
+            query = query.order_by(sort_column.desc(), models.Product.product_id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), models.Product.product_id.asc())
         
-        # Build response
-        result = []
-        for product in items:
-            # Get product description
-            description = db.query(models.ProductDescription).filter(
-                models.ProductDescription.product_id == product.product_id,
-                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
-            ).first()
-            
-            if not description:
-                continue
-                
-            # Determine stock status
-            stock_status = "OUT_OF_STOCK"
-            if product.quantity > 0:
-                stock_status = "IN_STOCK"
-            
-            # Calculate price
-            price = float(product.price)
-            
-            # Since original_price column doesn't exist yet, we'll use a workaround
-            # In a real implementation, you'd fetch this from a discount table or calculate it
-            original_price = None
-            discount_percentage = None
-            
-            # For demo purposes, let's simulate a 10% discount on some products
-            if product.product_id % 3 == 0:  # Apply to every 3rd product for demo
-                original_price = round(price * 1.1, 2)  # 10% higher than current price
-                discount_percentage = 10
-            
-            # Get the corresponding one_items entry
-            one_item = db.query(models.OneItems).filter(
-                models.OneItems.oc_id == product.product_id
-            ).first()
-            
-            # Use one_items.id if available, otherwise fallback to product.product_id
-            item_id = one_item.id if one_item else product.product_id
-            
-            # Add product to results
-            result.append({
-                "itemId": item_id,
-                "name": description.name,
-                "imageUrl": f"https://assets2.panuval.com/image/cache/catalog/{product.image}" if product.image else None,
-                "price": price,
-                "originalPrice": original_price,
-                "discountPercentage": discount_percentage,
-                "stockStatus": stock_status
-            })
+        # Apply pagination. Ranked ids were drawn from the filtered candidates,
+        # so relevance pages need no page query at all.
+        if ranked_ids is not None:
+            rows = []
+            page_ids = ranked_ids
+        else:
+            if keyset is not None:
+                query = query.filter(
+                    keyset_after([sort_column, models.Product.product_id], keyset, descending)
+                )
+                rows = query.limit(page_size).all()
+            else:
+                rows = query.offset(offset).limit(page_size).all()
+            page_ids = [row.product_id for row in rows]
+        
+        # Cursor for the next page: an offset for in-memory relevance ranking,
+        # otherwise the sort key of the last row
+        next_cursor = None
+        has_more = offset + len(page_ids) < total_count or (total_is_estimate and len(page_ids) == page_size)
+        if page_ids and has_more:
+            carried_total = None if total_is_estimate else total_count
+            if ranked_ids is not None:
+                next_cursor = encode_cursor(sort_by, page + 1, offset=offset + page_size, total=carried_total)
+            else:
+                last = rows[-1]
+                next_cursor = encode_cursor(
+                    sort_by, page + 1, key=[last.sort_key, last.product_id], total=carried_total
+                )
+        
+        # Build response, trimmed to the selected fields
+        cards = item_cards.get_many(db, page_ids)
+        result = [project(cards[product_id], selected) for product_id in page_ids if product_id in cards]
         
         # Build pagination info
         pagination = {
             "currentPage": page,
             "pageSize": page_size,
             "totalItems": total_count,
-            "totalPages": (total_count + page_size - 1) // page_size
+            "totalPages": (total_count + page_size - 1) // page_size,
+            "totalIsEstimate": total_is_estimate,
+            "nextCursor": next_cursor
         }
         
         # Construct display text
@@ -169,212 +320,224 @@ def search_items(
         if q:
             display_text = f"Search results for '{q}'"
         elif category_id and len(category_id) == 1:
-            # Try to get category name if only one category is selected
-            try:
-                category = db.query(models.Category).filter(
-                    models.Category.category_id == int(category_id[0])
-                ).first()
-                if category:
-                    # Get category description for the name
-                    category_description = db.query(models.CategoryDescription).filter(
-                        models.CategoryDescription.category_id == category.category_id,
-                        models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
-                    ).first()
-                    display_text = category_description.name if category_description else f"Category {category.category_id}"
-            except:
-                pass
+            # Use the category name if only one category is selected
+            selected_category = int(category_id[0])
+            if category_tree.ready:
+                display_text = category_tree.name(selected_category) or display_text
+            else:
+                category_name = db.query(models.CategoryDescription.name).filter(
+                    models.CategoryDescription.category_id == selected_category,
+                    models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+                ).scalar()
+                display_text = category_name or display_text
         
-        return {
+        # The order actually applied: relevance needs a keyword and the
+        # indexes, and is otherwise replaced by newest first
+        if ranked_ids is not None:
+            applied_sort = "relevance"
+        else:
+            applied_sort = sort_by if sort_by in SEARCH_SORTS else "year_newest"
+        
+        payload = {
             "displayText": display_text,
             "items": result,
-            "pagination": pagination
+            "pagination": pagination,
+            "fuzzyMatch": fuzzy,
+            "appliedSort": applied_sort
         }
+        
+        # Facet counts come from the in-memory facet index in one pass over the
+        # keyword matches; null when the index (or, with a keyword, the search
+        # index) is not built yet
+        if include_facets:
+            facets = None
+            if not q or matched_ids is not None:
+                facets = facet_index.facets(matched_ids, facet_filters)
+            payload["facets"] = facets
+        
+        set_cache_headers(response, http_cache.ITEM_LISTING, etag)
+        return payload
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=500, detail=f"Error searching items: {str(e)}")
 
+@router.get("/suggest")
+@router.get("/auto-suggest", include_in_schema=False)
+def suggest_items(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100, description="Text typed so far"),
+    limit: int = Query(10, ge=1, le=TOP_K, description="Maximum number of suggestions"),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Typeahead suggestions for the search box.
+
+    Matches item, author, publisher and category names at any of their
+    leading words and returns the most popular first. Served from the
+    in-memory suggest index; until it has loaded, only item names are
+    suggested straight from the database.
+    """
+    try:
+        suggestions = suggest_index.suggest(q, limit)
+        if suggestions is None:
+            rows = db.query(
+                models.Product.product_id,
+                models.ProductDescription.name,
+                select(func.min(models.OneItems.id)).where(
+                    models.OneItems.oc_id == models.Product.product_id
+                ).scalar_subquery()
+            ).join(
+                models.ProductDescription,
+                and_(
+                    models.Product.product_id == models.ProductDescription.product_id,
+                    models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+                )
+            ).filter(
+                models.Product.status == 1,
+                models.ProductDescription.name.ilike(f"{_like_escape(q.strip())}%", escape="\\")
+            ).order_by(models.Product.viewed.desc()).limit(limit).all()
+            suggestions = [
+                Suggestion("ITEM", product_id, name, 0.0, one_item_id or product_id)
+                for product_id, name, one_item_id in rows
+            ]
+        return http_cache.conditional_body(
+            request, response, [suggestion.as_dict() for suggestion in suggestions], http_cache.SUGGEST
+        )
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error fetching suggestions: {str(e)}")
+
+@router.get("/batch")
+def get_item_details_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Comma-separated item ids"),
+    fields: Optional[str] = Query(None, description="Comma-separated payload fields to return (all if omitted)"),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Get details for several items at once, e.g. to prefetch a carousel.
+    
+    All ids are resolved with the same bulk queries as a single detail
+    request. Ids that do not resolve to an active item are reported under
+    "errors" instead of failing the batch.
+    """
+    try:
+        try:
+            item_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+        if not item_ids:
+            raise HTTPException(status_code=400, detail="ids must not be empty")
+        if len(item_ids) > settings.ITEM_BATCH_MAX_IDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {settings.ITEM_BATCH_MAX_IDS} ids can be requested at once"
+            )
+        
+        selected = parse_fields(fields, DETAIL_FIELDS, always=["itemId"])
+        
+        product_ids = resolve_product_ids(db, item_ids)
+        if request.headers.get("if-none-match"):
+            unchanged = not_modified(
+                request, _items_etag(db, "batch", item_ids, product_ids, selected), http_cache.ITEM_DETAIL
+            )
+            if unchanged is not None:
+                return unchanged
+        
+        items = load_item_details(db, product_ids, selected)
+        set_cache_headers(
+            response, http_cache.ITEM_DETAIL, _items_etag(db, "batch", item_ids, product_ids, selected)
+        )
+        return {
+            "items": {str(item_id): items[item_id] for item_id in item_ids if item_id in items},
+            "errors": {str(item_id): "Item not found" for item_id in item_ids if item_id not in items}
+        }
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving item details: {str(e)}")
+
+@router.get("/{item_id}/related")
+def get_related_items(
+    request: Request,
+    response: Response,
+    item_id: int = Path(..., description="The item to find related items for"),
+    limit: int = Query(10, ge=1, le=RELATED_TOP_N, description="Items per rail"),
+    fields: Optional[str] = Query(None, description="Comma-separated card fields to return (all if omitted)"),
+    db: Session = Depends(get_db)
+) -> Any:
+    """
+    Related-item rails for item detail: bought together, more by the same
+    author and more from the same publisher.
+
+    The neighbours are precomputed by related_items, so a request is one
+    lookup per rail plus card reads from the item card store. Until the
+    first build has finished the rails are empty.
+    """
+    try:
+        selected = parse_fields(fields, SEARCH_FIELDS, always=["itemId"])
+
+        product_id = resolve_product_ids(db, [item_id])[item_id]
+        rails = related_items.related(product_id, limit)
+        cards = item_cards.get_many(db, [product_id, *(pid for ids in rails.values() for pid in ids)])
+        if product_id not in cards:
+            raise HTTPException(status_code=404, detail="Item not found")
+
+        content = {"itemId": item_id}
+        for rail, ids in rails.items():
+            content[rail] = [project(cards[pid], selected) for pid in ids if pid in cards]
+        return http_cache.conditional_body(request, response, content, http_cache.ITEM_LISTING)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving related items: {str(e)}")
+
 @router.get("/{item_id}")
 def get_item_detail(
+    request: Request,
+    response: Response,
     item_id: int = Path(..., description="The ID of the item to retrieve"),
+    fields: Optional[str] = Query(None, description="Comma-separated payload fields to return (all if omitted)"),
     db: Session = Depends(get_db)
 ) -> Any:
     """
     Get detailed information about a specific item by its ID.
+    
+    The item id is resolved through one_items and every part of the payload
+    is loaded with one bulk query, so the statement count does not depend
+    on how many categories, authors, publishers or images the item has.
+    
+    The ETag is derived from the item's version, stock, label and price, so
+    a revalidation of an unchanged item is answered with 304 without
+    assembling the payload.
+    
+    fields= narrows the payload; on a cache miss only the columns and
+    sub-queries for the selected fields are loaded.
     """
     try:
-        # Check if the item_id is from one_items table
-        one_item = db.query(models.OneItems).filter(
-            models.OneItems.id == item_id
-        ).first()
+        selected = parse_fields(fields, DETAIL_FIELDS, always=["itemId"])
         
-        # If found in one_items, use oc_id to get the product
-        if one_item:
-            product_id = one_item.oc_id
-        else:
-            # Fallback to using item_id directly as product_id
-            product_id = item_id
-            
-        # Get the product
-        product = db.query(models.Product).filter(
-            models.Product.product_id == product_id,
-            models.Product.status == 1
-        ).first()
+        product_ids = resolve_product_ids(db, [item_id])
+        if request.headers.get("if-none-match"):
+            unchanged = not_modified(
+                request, _items_etag(db, "item", [item_id], product_ids, selected), http_cache.ITEM_DETAIL
+            )
+            if unchanged is not None:
+                return unchanged
         
-        if not product:
+        item = load_item_details(db, product_ids, selected).get(item_id)
+        if item is None:
             raise HTTPException(status_code=404, detail="Item not found")
-        
-        # Get product description
-        description = db.query(models.ProductDescription).filter(
-            models.ProductDescription.product_id == product_id,
-            models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
-        ).first()
-        
-        if not description:
-            raise HTTPException(status_code=404, detail="Item description not found")
-        
-        # Determine stock status
-        stock_status = "OUT_OF_STOCK"
-        if product.quantity > 0:
-            stock_status = "IN_STOCK"
-        
-        # Calculate price
-        price = float(product.price)
-        
-        # Since original_price column doesn't exist yet, we'll use a workaround
-        # In a real implementation, you'd fetch this from a discount table or calculate it
-        original_price = None
-        discount_percentage = None
-        
-        # For demo purposes, let's simulate a 10% discount on some products
-        if product.product_id % 3 == 0:  # Apply to every 3rd product for demo
-            original_price = round(price * 1.1, 2)  # 10% higher than current price
-            discount_percentage = 10
-        
-        # Get product categories
-        categories = []
-        product_categories = db.query(models.ProductToCategory).filter(
-            models.ProductToCategory.product_id == product_id
-        ).all()
-        
-        for pc in product_categories:
-            category = db.query(models.Category).filter(
-                models.Category.category_id == pc.category_id
-            ).first()
-            
-            if category:
-                # Get category description for the name
-                category_description = db.query(models.CategoryDescription).filter(
-                    models.CategoryDescription.category_id == category.category_id,
-                    models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
-                ).first()
-                
-                categories.append({
-                    "id": category.category_id,
-                    "name": category_description.name if category_description else f"Category {category.category_id}",
-                    "searchFilter": f"categoryId={category.category_id}"
-                })
-        
-        # Get additional product images
-        more_images = []
-        try:
-            product_images = db.query(models.ProductImage).filter(
-                models.ProductImage.product_id == product_id
-            ).order_by(models.ProductImage.sort_order).all()
-            
-            for img in product_images:
-                if img.image:
-                    more_images.append(f"https://assets2.panuval.com/image/cache/catalog/{img.image}")
-        except:
-            # If the model doesn't exist or there's an error, continue without additional images
-            pass
-        
-        # Compile product details
-        details = {
-            "ISBN": product.isbn,
-            "SKU": product.sku,
-            "Model": product.model,
-            "Manufacturer": str(product.manufacturer_id),
-            "Weight": str(product.weight),
-            "Height": str(product.height),
-            "Width": str(product.width),
-            "Length": str(product.length)
-        }
-        
-        # Get authors
-        authors = []
-        try:
-            product_authors = db.query(models.ProductAuthor).filter(
-                models.ProductAuthor.product_id == product_id
-            ).all()
-            
-            for pa in product_authors:
-                author = db.query(models.Author).filter(
-                    models.Author.author_id == pa.author_id,
-                    models.Author.status == True
-                ).first()
-                
-                if author:
-                    authors.append({
-                        "id": author.author_id,
-                        "name": author.name,
-                        "imageUrl": f"https://assets2.panuval.com/image/cache/catalog/{author.image}" if author.image else None,
-                        "searchFilter": f"authorId={author.author_id}"
-                    })
-        except:
-            # If the model doesn't exist or there's an error, continue without authors
-            pass
-            
-        # Get publishers
-        publishers = []
-        try:
-            product_publishers = db.query(models.ProductPublisher).filter(
-                models.ProductPublisher.product_id == product_id
-            ).all()
-            
-            for pp in product_publishers:
-                publisher = db.query(models.Publisher).filter(
-                    models.Publisher.publisher_id == pp.publisher_id,
-                    models.Publisher.status == True
-                ).first()
-                
-                if publisher:
-                    publishers.append({
-                        "id": publisher.publisher_id,
-                        "name": publisher.name,
-                        "imageUrl": f"https://assets2.panuval.com/image/cache/catalog/{publisher.image}" if publisher.image else None,
-                        "searchFilter": f"publisherId={publisher.publisher_id}"
-                    })
-        except:
-            # If the model doesn't exist or there's an error, continue without publishers
-            pass
-        
-        # Get the item_id to return (either one_items.id or fallback to product.product_id)
-        response_item_id = item_id  # Use the requested item_id which is already mapped correctly
-        
-        # Build response
-        return {
-            "itemId": response_item_id,
-            "title": description.name,
-            "subTitle": None,  # Assuming no subtitle in current model
-            "description": description.description,
-            "coverImageUrl": f"https://assets2.panuval.com/image/cache/catalog/{product.image}" if product.image else None,
-            "moreImages": more_images,
-            "price": price,
-            "originalPrice": original_price,
-            "discountPercentage": discount_percentage,
-            "stockStatus": stock_status,
-            "shortDescription": description.meta_description or "",
-            "details": details,
-            "authors": authors,
-            "publishers": publishers,
-            "categories": categories,
-            "highlights": description.tag.split(',') if description.tag else [],
-            "policyText": None,  # Would need policy configuration
-            "label": {
-                "label": "NEW_ARRIVAL" if (product.date_added and (datetime.now() - product.date_added).days < 30) else None,
-                "showLabel": True if (product.date_added and (datetime.now() - product.date_added).days < 30) else False,
-                "labelType": "NEW_ARRIVAL" if (product.date_added and (datetime.now() - product.date_added).days < 30) else "NONE"
-            }
-        }
+        # Without a field selection the payload is cached by now, so this
+        # costs no further query
+        set_cache_headers(
+            response, http_cache.ITEM_DETAIL, _items_etag(db, "item", [item_id], product_ids, selected)
+        )
+        return item
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
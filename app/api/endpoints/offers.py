@@ -1,36 +1,36 @@
-from typing import Any, List
+from typing import Any
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import schemas
+from app.core import http_cache
+from app.core.precompressed import payload_response
 from app.db.database import get_db
 from app.core.security import oauth2_scheme
+from app.services.active_windows import offer_index
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 def get_active_offers(
+    request: Request,
     db: Session = Depends(get_db)
 ) -> Any:
     """
     Retrieve all active offers
+
+    An offer is active while its status is set and the current time is
+    within its start and end dates. Answered from the in-memory offer
+    index; Cache-Control never outlives the next offer start or end.
     """
-    offers = db.query(models.Offer).filter(models.Offer.status == 1).all()
-    
-    result = []
-    for offer in offers:
-        result.append({
-            "offer_id": offer.offer_id,
-            "title": offer.title,
-            "discount_type": offer.discount_type,
-            "discount_value": offer.discount_value,
-            "start_date": offer.start_date,
-            "end_date": offer.end_date,
-            "status": offer.status
-        })
-    
-    return result
+    try:
+        now = datetime.now()
+        payload, next_change = offer_index.active(db, now)
+        return payload_response(request, payload, http_cache.PROMOTIONS.until(next_change, now))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving offers: {str(e)}")
 
 @router.get("/{offer_id}", response_model=dict)
 def get_offer_by_id(
@@ -40,19 +40,9 @@ def get_offer_by_id(
     """
     Get a specific offer by ID
     """
-    offer = db.query(models.Offer).filter(
-        models.Offer.offer_id == offer_id
-    ).first()
+    offer = offer_index.get(db, offer_id)
     
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     
-    return {
-        "offer_id": offer.offer_id,
-        "title": offer.title,
-        "discount_type": offer.discount_type,
-        "discount_value": offer.discount_value,
-        "start_date": offer.start_date,
-        "end_date": offer.end_date,
-        "status": offer.status
-    }
\ No newline at end of file
+    return offer
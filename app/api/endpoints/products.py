@@ -4,21 +4,50 @@ from sqlalchemy.orm import Session
 from decimal import Decimal
 
 from app import models
+from app.core.fields import parse_fields, project
+from app.core.pagination import decode_cursor, encode_cursor
 from app.db.database import get_db
+from app.services.count_cache import count_total, filter_signature
+from app.services.item_cards import item_cards
 
 router = APIRouter()
 
+# Fields each listed product can be narrowed to with fields=
+PRODUCT_LIST_FIELDS = (
+    "itemId", "name", "price", "imageUrl", "stockStatus", "originalPrice", "discountPercentage", "label"
+)
+
 @router.get("/")
 def get_products(
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    category_id: Optional[int] = None
+    category_id: Optional[int] = None,
+    cursor: Optional[str] = Query(None, description="Cursor from a previous response's pagination.nextCursor; takes precedence over page"),
+    count_mode: str = Query("exact", regex="^(exact|estimate)$", description="'estimate' caps the total for very broad queries"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return per product (all if omitted)")
 ) -> Any:
     """
     Retrieve all products with pagination
+    
+    The page query selects only product ids; the listed products are
+    cards from the item card store. Unlike the /items endpoints, itemId
+    here is the oc_product product_id, as it always has been for this
+    listing, and products are listed in product_id order.
     """
     try:
+        selected = parse_fields(fields, PRODUCT_LIST_FIELDS, always=["itemId"])
+        
+        # A cursor carries the last product_id so deep pages seek instead of
+        # skipping; page keeps working for older app versions.
+        last_product_id = None
+        cursor_total = None
+        if cursor:
+            position = decode_cursor(cursor, "product_id", key_types=(int,))
+            page = position["p"]
+            last_product_id = position["k"][0] if position.get("k") else None
+            cursor_total = position.get("t")
+        
         # Calculate skip for pagination
         skip = (page - 1) * limit
         
@@ -31,42 +60,46 @@ def get_products(
                 models.ProductToCategory.category_id == category_id
             )
         
-        # Get total count
-        total_count = query.count()
+        # Get total count; later pages reuse the one carried in the cursor
+        total_is_estimate = False
+        if cursor_total is not None:
+            total_count = cursor_total
+        else:
+            total_count, total_is_estimate = count_total(
+                query,
+                models.Product.product_id,
+                filter_signature("products", category_id=category_id),
+                count_mode
+            )
         
-        # Get products with pagination
-        products = query.offset(skip).limit(limit).all()
+        # Get products with pagination, in product_id order so the page
+        # boundaries are stable (the primary-key order MySQL returned
+        # before the listing had an ORDER BY)
+        query = query.with_entities(models.Product.product_id)
+        query = query.order_by(models.Product.product_id.asc())
+        if last_product_id is not None:
+            products = query.filter(models.Product.product_id > last_product_id).limit(limit).all()
+        else:
+            products = query.offset(skip).limit(limit).all()
         
-        # Build response
-        result = []
-        for product in products:
-            # Get product description (assuming English is language_id 1)
-            description = db.query(models.ProductDescription).filter(
-                models.ProductDescription.product_id == product.product_id,
-                models.ProductDescription.language_id == 1
-            ).first()
-            
-            # Determine stock status
-            stock_status = "OUT_OF_STOCK"
-            if product.quantity > 0:
-                stock_status = "IN_STOCK"
-                
-            # Format the product data according to ItemSummary schema
-            product_data = {
-                "itemId": product.product_id,
-                "name": description.name if description else "",
-                "price": float(product.price),
-                "imageUrl": f"https://assets2.panuval.com/image/cache/catalog/{product.image}" if product.image else None,
-                "stockStatus": stock_status,
-                "originalPrice": None,
-                "discountPercentage": None,
-                "label": {
-                    "label": None,
-                    "showLabel": False,
-                    "labelType": "NONE"
-                }
-            }
-            result.append(product_data)
+        next_cursor = None
+        has_more = skip + len(products) < total_count or (total_is_estimate and len(products) == limit)
+        if products and has_more:
+            next_cursor = encode_cursor(
+                "product_id",
+                page + 1,
+                key=[products[-1].product_id],
+                total=None if total_is_estimate else total_count
+            )
+        
+        # Build response from the item card store, trimmed to the selected
+        # fields; cards carry the one_items id, this listing the product_id
+        cards = item_cards.get_many(db, [product.product_id for product in products])
+        result = [
+            project(dict(cards[product.product_id], itemId=product.product_id), selected)
+            for product in products
+            if product.product_id in cards
+        ]
         
         return {
             "displayText": "Products",
@@ -75,10 +108,14 @@ def get_products(
                 "currentPage": page,
                 "pageSize": limit,
                 "totalItems": total_count,
-                "totalPages": (total_count + limit - 1) // limit
+                "totalPages": (total_count + limit - 1) // limit,
+                "totalIsEstimate": total_is_estimate,
+                "nextCursor": next_cursor
             }
         }
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
 @router.get("/{product_id}")
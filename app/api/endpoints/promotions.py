@@ -1,45 +1,71 @@
-from typing import Any, List
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
-from app import models, schemas
+from app import schemas
+from app.core import http_cache
+from app.core.pagination import decode_cursor, encode_cursor
 from app.db.database import get_db
 from app.core.security import oauth2_scheme
+from app.services.item_cards import item_cards
+from app.services.promotions import promotion_feed
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
+@router.get("/")
 def get_promotional_products(
+    request: Request,
+    response: Response,
+    page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous response's pagination.nextCursor"),
     db: Session = Depends(get_db)
 ) -> Any:
     """
-    Retrieve all promotional products
+    Retrieve promotional products, biggest discount first
+
+    The ranking is precomputed by the promotions service; a page is a
+    lookup after the cursor's rank key plus card reads from the item card
+    store. A product the service still ranks but whose card shows no
+    discount (its base price changed since the last poll) is skipped, and
+    the page is topped up from further down the ranking; totalItems still
+    counts it until that poll.
     """
-    # This query would need to be adjusted based on your actual database structure
-    # The following is a simplified example
-    
-    promotional_products = []
-    
-    # In a real implementation, you'd query products with active promotions
-    # Here's a placeholder response:
-    promotional_products = [
-        {
-            "product_id": 1,
-            "name": "Winter Jacket",
-            "price": 99.99,
-            "discount_price": 79.99,
-            "image": "image_url",
-            "offer": "20% off"
-        },
-        {
-            "product_id": 2,
-            "name": "Snow Boots",
-            "price": 49.99,
-            "discount_price": 39.99,
-            "image": "image_url",
-            "offer": "Buy 1 Get 1 Free"
+    try:
+        page = 1
+        after = None
+        if cursor:
+            position = decode_cursor(cursor, "promotions", key_types=(int, (int, float), int))
+            page = position["p"]
+            after = position.get("k")
+        
+        if not promotion_feed.ready:
+            promotion_feed.rebuild(db)
+        # Prices are resolved now; anything no longer discounted is dropped
+        # rather than shown at full price, and the cursor moves past it
+        items = []
+        while True:
+            product_ids, last, total = promotion_feed.page(after, page_size - len(items))
+            cards = item_cards.get_many(db, product_ids)
+            items.extend(
+                cards[product_id] for product_id in product_ids
+                if product_id in cards and cards[product_id]["discountPercentage"]
+            )
+            if last is None or len(items) >= page_size:
+                break
+            after = last
+        
+        content = {
+            "items": items,
+            "pagination": {
+                "currentPage": page,
+                "pageSize": page_size,
+                "totalItems": total,
+                "nextCursor": encode_cursor("promotions", page + 1, key=list(last)) if last else None
+            }
         }
-    ]
-    
-    return promotional_products
\ No newline at end of file
+        return http_cache.conditional_body(request, response, content, http_cache.PROMOTIONS)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error retrieving promotions: {str(e)}")
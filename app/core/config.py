@@ -28,6 +28,56 @@ class Settings(BaseSettings):
     MSG91_AUTH_KEY: str = ""
     MSG91_TEMPLATE_ID: str = ""
     
+    # In-memory search index settings
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_REFRESH_SECONDS: int = 60
+    # Above this many matches the predicate path is used instead of an IN list
+    SEARCH_INDEX_MAX_CANDIDATES: int = 5000
+    SUGGEST_INDEX_REFRESH_SECONDS: int = 60
+    
+    # Catalog change polling and total-count caching
+    CATALOG_VERSION_REFRESH_SECONDS: int = 30
+    COUNT_CACHE_TTL_SECONDS: int = 300
+    COUNT_CACHE_MAX_ENTRIES: int = 10000
+    # count_mode=estimate stops counting after this many rows
+    COUNT_ESTIMATE_CAP: int = 10000
+    
+    # Reload interval for product specials and offers
+    PRICING_REFRESH_SECONDS: int = 60
+    # Apply active oc_offer rows to every price and cart total. Offers are not
+    # linked to products, so enabling one discounts the whole catalog.
+    STORE_WIDE_OFFERS_ENABLED: bool = False
+    
+    # Item detail payload cache. The byte budget counts serialised payload size;
+    # ITEM_CACHE_REDIS_URL (e.g. redis://localhost:6379/0) adds a tier shared by all workers,
+    # which also lets one worker build the related-item rails for all of them
+    ITEM_CACHE_MAX_ENTRIES: int = 20000
+    ITEM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    ITEM_CACHE_TTL_SECONDS: int = 600
+    ITEM_CACHE_REDIS_URL: str = ""
+    # Largest id list accepted by /items/batch
+    ITEM_BATCH_MAX_IDS: int = 50
+    # Poll interval for new one_items rows
+    ONE_ITEMS_REFRESH_SECONDS: int = 30
+    # Poll interval for changed products in the item card store
+    ITEM_CARDS_REFRESH_SECONDS: int = 15
+    # Poll interval for home layout changes
+    HOME_LAYOUT_REFRESH_SECONDS: int = 30
+    # Poll interval for banner changes
+    BANNER_REFRESH_SECONDS: int = 60
+    # Poll interval for offer and campaign changes
+    OFFERS_REFRESH_SECONDS: int = 60
+    # Poll interval for re-ranking promotional products
+    PROMOTIONS_REFRESH_SECONDS: int = 30
+    # Longest time an assembled /app/home/feed document is reused
+    HOME_FEED_TTL_SECONDS: int = 60
+    # Poll interval for new orders and shared builds; related items are rebuilt
+    # at most every 6h
+    RELATED_ITEMS_REFRESH_SECONDS: int = 60
+    
+    # ETag / Cache-Control headers on the public catalog endpoints
+    HTTP_CACHE_ENABLED: bool = True
+    
     class Config:
         case_sensitive = True
         env_file = ".env"
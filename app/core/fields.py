@@ -0,0 +1,53 @@
+"""
+Client-selected response fields (the fields= query parameter).
+
+An endpoint declares the top-level fields it can return. parse_fields()
+checks a request's comma-separated selection against them, and the
+endpoint uses the result twice: to decide which columns and sub-queries
+to run at all, and to trim the payload with project(). None means no
+selection, i.e. every field.
+"""
+from typing import Collection, FrozenSet, Iterable, Optional
+
+from fastapi import HTTPException
+
+Fields = Optional[FrozenSet[str]]
+
+
+def parse_fields(fields: Optional[str], available: Collection[str], always: Iterable[str] = ()) -> Fields:
+    """
+    Validate a fields= parameter
+
+    Args:
+        fields: Raw parameter value, e.g. "name,price"
+        available: Fields the endpoint can return
+        always: Fields included whatever was asked for (e.g. the id)
+
+    Returns:
+        The selected fields, or None if the parameter was not given
+
+    Raises:
+        HTTPException: 400 if a selected field is unknown
+    """
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected.difference(available)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(available)}"
+        )
+    return frozenset(selected.union(always))
+
+
+def wants(fields: Fields, *names: str) -> bool:
+    """Whether any of the named fields is selected."""
+    return fields is None or any(name in fields for name in names)
+
+
+def project(payload: dict, fields: Fields) -> dict:
+    """The payload restricted to the selected fields."""
+    if fields is None:
+        return payload
+    return {name: value for name, value in payload.items() if name in fields}
@@ -0,0 +1,129 @@
+"""
+Conditional GET and Cache-Control for the public catalog endpoints.
+
+Responses carry a strong ETag and a per-route Cache-Control policy. Where
+an endpoint can name what its response is derived from (date_modified
+watermarks, snapshot signatures, the current prices) the ETag is a hash of
+those validators and the request parameters, so a matching If-None-Match
+is answered with 304 before any of the response is built. Endpoints
+without such validators hash the body instead, which saves the transfer
+but not the work.
+
+Validators are polled, so an ETag can lag the database by up to one
+refresh interval; that is within the max-age the policies allow anyway.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+
+# Bump when the format of a cached response changes, so clients holding an
+# ETag for the old format are sent the new one
+RESPONSE_FORMAT = 1
+
+
+class CachePolicy(NamedTuple):
+    """Cache-Control for one route; all values in seconds."""
+    max_age: int
+    stale_while_revalidate: int = 0
+    stale_if_error: int = 0
+
+    @property
+    def header(self) -> str:
+        directives = ["public", f"max-age={self.max_age}"]
+        if self.stale_while_revalidate:
+            directives.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        if self.stale_if_error:
+            directives.append(f"stale-if-error={self.stale_if_error}")
+        return ", ".join(directives)
+
+    def until(self, expires: Optional[datetime], now: Optional[datetime] = None) -> "CachePolicy":
+        """This policy, capped so caches revalidate once expires has passed."""
+        if expires is None:
+            return self
+        seconds = int(max((expires - (now or datetime.now())).total_seconds(), 0))
+        if seconds >= self.max_age + self.stale_while_revalidate:
+            return self
+        return self._replace(max_age=min(self.max_age, seconds), stale_while_revalidate=0)
+
+
+# Anything showing prices or stock stays short-lived so a CDN does not keep
+# serving an ended offer; browse structure changes rarely
+ITEM_DETAIL = CachePolicy(max_age=60, stale_while_revalidate=300, stale_if_error=86400)
+ITEM_LISTING = CachePolicy(max_age=30, stale_while_revalidate=120, stale_if_error=3600)
+SUGGEST = CachePolicy(max_age=300, stale_while_revalidate=600, stale_if_error=86400)
+CATEGORIES = CachePolicy(max_age=600, stale_while_revalidate=3600, stale_if_error=86400)
+HOME = CachePolicy(max_age=60, stale_while_revalidate=600, stale_if_error=86400)
+BANNERS = CachePolicy(max_age=300, stale_while_revalidate=3600, stale_if_error=86400)
+PROMOTIONS = CachePolicy(max_age=60, stale_while_revalidate=300, stale_if_error=3600)
+
+
+def make_etag(*validators: Any) -> str:
+    """
+    Strong ETag from the values a response is derived from
+
+    Validators must have a stable repr across processes (numbers, strings,
+    datetimes, and tuples or sorted lists of those) so every worker issues
+    the same ETag for the same content.
+    """
+    digest = hashlib.sha1(repr((RESPONSE_FORMAT,) + validators).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def body_etag(content: Any) -> str:
+    """Strong ETag from the response body itself."""
+    return make_etag(json.dumps(jsonable_encoder(content), sort_keys=True, separators=(",", ":")))
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _headers(etag: Optional[str], policy: CachePolicy) -> dict:
+    headers = {"Cache-Control": policy.header}
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def not_modified(request: Request, etag: Optional[str], policy: CachePolicy) -> Optional[Response]:
+    """A 304 response if the client already holds this ETag, otherwise None."""
+    if not settings.HTTP_CACHE_ENABLED or not etag:
+        return None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=_headers(etag, policy))
+    return None
+
+
+def set_cache_headers(response: Response, policy: CachePolicy, etag: Optional[str] = None) -> None:
+    """Attach Cache-Control and, if known, the ETag to a 200 response."""
+    if settings.HTTP_CACHE_ENABLED:
+        response.headers.update(_headers(etag, policy))
+
+
+def conditional_body(request: Request, response: Response, content: Any, policy: CachePolicy) -> Any:
+    """Return content with body-hash caching headers, or a 304 if unchanged."""
+    if not settings.HTTP_CACHE_ENABLED:
+        return content
+    etag = body_etag(content)
+    unchanged = not_modified(request, etag, policy)
+    if unchanged is not None:
+        return unchanged
+    set_cache_headers(response, policy, etag)
+    return content
@@ -0,0 +1,127 @@
+"""
+Opaque keyset cursors for paginated list endpoints.
+
+A cursor records the sort it was issued for, the page number it leads to,
+the total row count, and either the sort key of the last row returned
+(keyset pagination) or a plain offset for orderings computed in memory.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _load(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(
+    sort_by: str,
+    page: int,
+    key: Optional[Sequence[Any]] = None,
+    offset: Optional[int] = None,
+    total: Optional[int] = None
+) -> str:
+    """
+    Build an opaque cursor for the next page
+
+    Args:
+        sort_by: Sort the cursor is valid for
+        page: Page number the cursor leads to
+        key: Sort key values of the last row returned, tiebreaker last
+        offset: Row offset, for orderings that cannot be expressed in SQL
+        total: Total row count, so later pages need not count again
+
+    Returns:
+        URL-safe cursor string
+    """
+    payload = {"s": sort_by, "p": page}
+    if key is not None:
+        payload["k"] = [_dump(value) for value in key]
+    if offset is not None:
+        payload["o"] = offset
+    if total is not None:
+        payload["t"] = total
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _count(value: Any, minimum: int = 0) -> bool:
+    # bool is an int subclass, but never a valid page, offset or total
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+def decode_cursor(cursor: str, sort_by: str, key_types: Optional[Sequence[Any]] = None) -> dict:
+    """
+    Decode a cursor issued by encode_cursor
+
+    Args:
+        cursor: Cursor from a previous response
+        sort_by: Sort the cursor must have been issued for
+        key_types: If given, the key must have one value per entry, each an
+            instance of that type (or tuple of types)
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was issued for a
+            different sort
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict) or not _count(payload.get("p"), 1):
+            raise ValueError("missing page")
+        if any(name in payload and not _count(payload[name]) for name in ("o", "t")):
+            raise ValueError("bad offset or total")
+        if "k" in payload:
+            if not isinstance(payload["k"], list):
+                raise ValueError("bad key")
+            payload["k"] = [_load(value) for value in payload["k"]]
+            if key_types is not None and (
+                len(payload["k"]) != len(key_types)
+                or any(
+                    isinstance(value, bool) or not isinstance(value, expected)
+                    for value, expected in zip(payload["k"], key_types)
+                )
+            ):
+                raise ValueError("bad key")
+    except (ValueError, TypeError, AttributeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("s") != sort_by:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort_by")
+    return payload
+
+
+def keyset_after(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+    """
+    Filter for rows strictly after `values` in (columns...) order
+
+    Expands the row comparison to (c1 > v1) OR (c1 = v1 AND c2 > v2) ...
+    so MySQL can use a range scan on the leading column.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, step) if equal else step)
+    return or_(*clauses)
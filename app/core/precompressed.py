@@ -0,0 +1,102 @@
+"""
+Pre-serialised, pre-compressed response bodies for near-static payloads.
+
+encode_payload() renders a payload to JSON bytes once, together with
+gzip and (if the brotli package is installed) brotli variants and an ETag
+per variant. payload_response() picks the variant the client accepts and
+returns it as-is, so serving a snapshot costs no JSON encoding and no
+compression. Build an EncodedPayload when the snapshot is built, not per
+request.
+"""
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.http_cache import RESPONSE_FORMAT, CachePolicy, not_modified
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional; gzip is always built
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+
+class EncodedPayload(NamedTuple):
+    """A payload's JSON body by content-coding ("identity", "gzip", "br")."""
+    bodies: Dict[str, bytes]
+    etags: Dict[str, str]
+
+    def nbytes(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+def encode_payload(content: Any) -> EncodedPayload:
+    """Serialise and compress a payload once."""
+    body = json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        # mtime=0 keeps the gzip bytes, and so the ETag, identical across workers
+        bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11)
+    digest = hashlib.sha1(repr(RESPONSE_FORMAT).encode("utf-8") + body).hexdigest()[:32]
+    # Strong ETags must differ between encodings of the same body
+    etags = {
+        coding: f'"{digest}"' if coding == "identity" else f'"{digest}-{coding}"'
+        for coding in bodies
+    }
+    return EncodedPayload(bodies, etags)
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def _choose_coding(request: Request, payload: EncodedPayload) -> str:
+    accepted = _accepted(request.headers.get("accept-encoding", ""))
+    best, best_quality = "identity", 0.0
+    # Smallest first, so br wins a tie with gzip
+    for coding in ("br", "gzip"):
+        if coding not in payload.bodies:
+            continue
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def payload_response(request: Request, payload: EncodedPayload, policy: CachePolicy) -> Response:
+    """The payload in the best encoding the client accepts, or a 304 if it has it already."""
+    coding = _choose_coding(request, payload)
+    etag = payload.etags[coding]
+    unchanged = not_modified(request, etag, policy)
+    if unchanged is not None:
+        unchanged.headers["Vary"] = "Accept-Encoding"
+        return unchanged
+    headers = {"Vary": "Accept-Encoding"}
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    if settings.HTTP_CACHE_ENABLED:
+        headers["Cache-Control"] = policy.header
+        headers["ETag"] = etag
+    return Response(content=payload.bodies[coding], media_type="application/json", headers=headers)
@@ -5,6 +5,23 @@ from fastapi.encoders import jsonable_encoder
 
 from app.api.api import api_router
 from app.core.config import settings
+from app.services import background
+from app.services.active_windows import campaign_index, offer_index
+from app.services.banner_store import banner_store
+from app.services.catalog_version import catalog_version
+from app.services.category_tree import category_tree
+from app.services.count_cache import count_cache
+from app.services.facet_index import facet_index
+from app.services.home_feed import home_feed_cache
+from app.services.home_layout import home_layout
+from app.services.item_cache import item_detail_cache
+from app.services.item_cards import item_cards
+from app.services.one_items import one_items_map
+from app.services.pricing import pricing_engine
+from app.services.promotions import promotion_feed
+from app.services.related_items import related_items
+from app.services.search_index import search_index
+from app.services.suggest_index import suggest_index
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -23,6 +40,28 @@ if settings.BACKEND_CORS_ORIGINS:
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.on_event("startup")
+def start_catalog_refresh():
+    # In-memory catalog snapshots are per worker and loaded in the background,
+    # so endpoints fall back to querying MySQL until they are ready.
+    background.register("catalog_version", catalog_version.refresh, settings.CATALOG_VERSION_REFRESH_SECONDS)
+    background.register("one_items_map", one_items_map.refresh, settings.ONE_ITEMS_REFRESH_SECONDS)
+    if settings.SEARCH_INDEX_ENABLED:
+        background.register("search_index", search_index.refresh, settings.SEARCH_INDEX_REFRESH_SECONDS)
+        background.register("suggest_index", suggest_index.refresh, settings.SUGGEST_INDEX_REFRESH_SECONDS)
+    background.register("facet_index", facet_index.refresh, settings.CATALOG_VERSION_REFRESH_SECONDS)
+    background.register("category_tree", category_tree.refresh, settings.CATALOG_VERSION_REFRESH_SECONDS)
+    background.register("pricing", pricing_engine.refresh, settings.PRICING_REFRESH_SECONDS)
+    background.register("item_cards", item_cards.refresh, settings.ITEM_CARDS_REFRESH_SECONDS)
+    background.register("offers", offer_index.refresh, settings.OFFERS_REFRESH_SECONDS)
+    background.register("campaigns", campaign_index.refresh, settings.OFFERS_REFRESH_SECONDS)
+    background.register("promotions", promotion_feed.refresh, settings.PROMOTIONS_REFRESH_SECONDS)
+    background.register("banners", banner_store.refresh, settings.BANNER_REFRESH_SECONDS)
+    background.register("home_layout", home_layout.refresh, settings.HOME_LAYOUT_REFRESH_SECONDS)
+    # Scans two years of order lines; runs on its own thread
+    background.register("related_items", related_items.refresh, settings.RELATED_ITEMS_REFRESH_SECONDS, dedicated=True)
+    background.start()
+
 @app.get("/")
 def root():
     return JSONResponse(
@@ -32,3 +71,14 @@ def root():
 @app.get("/health")
 def health_check():
     return JSONResponse(content={"status": "ok"})
+
+@app.get("/health/caches")
+def cache_stats():
+    # Per worker: each gunicorn worker reports its own caches
+    return JSONResponse(content={
+        "itemDetail": item_detail_cache.stats(),
+        "itemCards": {"ready": item_cards.ready, "bytes": item_cards.nbytes()},
+        "homeFeed": {"entries": len(home_feed_cache), "hits": home_feed_cache.hits, "misses": home_feed_cache.misses},
+        "relatedItems": {"ready": related_items.ready, "bytes": related_items.nbytes()},
+        "totalCounts": {"entries": len(count_cache), "hits": count_cache.hits, "misses": count_cache.misses}
+    })
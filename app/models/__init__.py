@@ -1,5 +1,5 @@
 from app.models.user import User
-from app.models.product import Product, ProductDescription, OneItems
+from app.models.product import Product, ProductDescription, OneItems, ProductSpecial
 from app.models.product_to_category import ProductToCategory
 from app.models.product_image import ProductImage
 from app.models.category import Category, CategoryDescription
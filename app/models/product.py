@@ -69,3 +69,14 @@ class ProductDescription(Base):
     meta_description = Column(String(255))
     meta_keyword = Column(String(255))
 
+
+class ProductSpecial(Base):
+    __tablename__ = "oc_product_special"
+    
+    product_special_id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("oc_product.product_id"), index=True)
+    customer_group_id = Column(Integer, nullable=False)
+    priority = Column(Integer, nullable=False, default=1)
+    price = Column(DECIMAL(15, 4), nullable=False, default=0.0000)
+    date_start = Column(Date, nullable=True)  # NULL / zero date = no start
+    date_end = Column(Date, nullable=True)  # NULL / zero date = no end
@@ -0,0 +1,159 @@
+"""
+Time-window indexes for offers and campaigns (oc_offer, oc_campaign).
+
+Rows are active while status is set and start_date <= now <= end_date
+(either end may be open). The index sorts every instant at which some
+row's window opens or closes and precomputes the active rows for each
+interval between two such instants, so "what is active now" is one
+bisection with no query. Entries flip between active and expired at
+their boundaries by lookup time alone; nothing has to run at the
+boundary. The JSON body of each interval is encoded the first time it is
+served and reused until the interval ends.
+
+The tables are small and have no date_modified, so the refresher reloads
+them on every poll and swaps in a new index only when a row changed.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.precompressed import EncodedPayload, encode_payload
+
+logger = logging.getLogger(__name__)
+
+# (row id, status, start, end)
+Window = Tuple[int, bool, Optional[datetime], Optional[datetime]]
+
+
+def _edges(start: Optional[datetime], end: Optional[datetime]) -> List[datetime]:
+    """Instants at which a [start, end] window opens and closes."""
+    edges = []
+    if start is not None:
+        edges.append(start)
+    if end is not None:
+        edges.append(end + timedelta(microseconds=1))
+    return edges
+
+
+def _in_window(start: Optional[datetime], end: Optional[datetime], now: datetime) -> bool:
+    return (start is None or start <= now) and (end is None or now <= end)
+
+
+class WindowSnapshot(NamedTuple):
+    rows: Dict[int, dict]  # id -> rendered row, active or not
+    edges: List[datetime]  # sorted, distinct
+    active: List[Tuple[int, ...]]  # active ids per interval; interval i ends at edges[i]
+    fingerprint: str
+
+
+def build_snapshot(windows: List[Window], rows: Dict[int, dict]) -> WindowSnapshot:
+    edges = sorted({edge for _, status, start, end in windows if status for edge in _edges(start, end)})
+    active: List[Tuple[int, ...]] = []
+    for i in range(len(edges) + 1):
+        # Any instant inside the interval will do: its start, or just
+        # before the first edge for the open-ended first interval
+        at = edges[i - 1] if i > 0 else (edges[0] - timedelta(microseconds=1) if edges else datetime.now())
+        active.append(tuple(
+            row_id for row_id, status, start, end in windows if status and _in_window(start, end, at)
+        ))
+    fingerprint = hashlib.sha1(repr((windows, sorted(rows.items()))).encode("utf-8")).hexdigest()
+    return WindowSnapshot(rows, edges, active, fingerprint)
+
+
+class ActiveWindowIndex:
+    """Rows of one table with date windows, looked up by instant."""
+
+    def __init__(self, name: str, load: Callable[[Session], List[Tuple[Window, dict]]]):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._snapshot: Optional[WindowSnapshot] = None
+        self._payloads: Dict[int, EncodedPayload] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self, db: Session) -> None:
+        """Reload the table; swap in a new index only if a row changed."""
+        loaded = sorted(self._load(db), key=lambda pair: pair[0][0])
+        snapshot = build_snapshot([window for window, _ in loaded], {window[0]: row for window, row in loaded})
+        if self._snapshot is not None and snapshot.fingerprint == self._snapshot.fingerprint:
+            return
+        with self._lock:
+            self._snapshot = snapshot
+            self._payloads = {}
+        logger.info(f"{self.name} index built: {len(snapshot.rows)} rows, {len(snapshot.edges)} window edges")
+
+    def snapshot(self, db: Session) -> WindowSnapshot:
+        """The current index, loaded on the spot if the refresher has not run yet."""
+        if self._snapshot is None:
+            self.refresh(db)
+        return self._snapshot
+
+    def get(self, db: Session, row_id: int) -> Optional[dict]:
+        """A row by id, whether active or not."""
+        return self.snapshot(db).rows.get(row_id)
+
+    def active(self, db: Session, now: Optional[datetime] = None) -> Tuple[EncodedPayload, Optional[datetime]]:
+        """
+        Rows active at an instant
+
+        Returns:
+            The encoded list of active rows, and the instant it next
+            changes (None if it never does)
+        """
+        snapshot = self.snapshot(db)
+        interval = bisect.bisect_right(snapshot.edges, now or datetime.now())
+        next_change = snapshot.edges[interval] if interval < len(snapshot.edges) else None
+        with self._lock:
+            payload = self._payloads.get(interval) if snapshot is self._snapshot else None
+            if payload is None:
+                payload = encode_payload([snapshot.rows[row_id] for row_id in snapshot.active[interval]])
+                if snapshot is self._snapshot:
+                    self._payloads[interval] = payload
+        return payload, next_change
+
+
+def _load_offers(db: Session) -> List[Tuple[Window, dict]]:
+    return [
+        (
+            (offer.offer_id, bool(offer.status), offer.start_date, offer.end_date),
+            {
+                "offer_id": offer.offer_id,
+                "title": offer.title,
+                "discount_type": offer.discount_type,
+                "discount_value": offer.discount_value,
+                "start_date": offer.start_date,
+                "end_date": offer.end_date,
+                "status": offer.status
+            }
+        )
+        for offer in db.query(models.Offer)
+    ]
+
+
+def _load_campaigns(db: Session) -> List[Tuple[Window, dict]]:
+    return [
+        (
+            (campaign.campaign_id, bool(campaign.status), campaign.start_date, campaign.end_date),
+            {
+                "campaign_id": campaign.campaign_id,
+                "title": campaign.title,
+                "start_date": campaign.start_date,
+                "end_date": campaign.end_date,
+                "status": campaign.status
+            }
+        )
+        for campaign in db.query(models.Campaign)
+    ]
+
+
+offer_index = ActiveWindowIndex("Offer", _load_offers)
+campaign_index = ActiveWindowIndex("Campaign", _load_campaigns)
@@ -0,0 +1,82 @@
+"""
+Background refresh of the per-worker in-memory catalog snapshots.
+
+Each gunicorn worker keeps its own copies of the search index and the other
+read models, so every worker runs one daemon thread that periodically calls
+the registered refresh functions with a fresh database session. Slow jobs
+registered as dedicated get a thread of their own, so a long build cannot
+hold up the quick polls.
+"""
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTask:
+    """A named refresh function and how often it should run."""
+
+    def __init__(self, name: str, refresh: Callable[[Session], None], interval: float, dedicated: bool = False):
+        self.name = name
+        self.refresh = refresh
+        self.interval = interval
+        self.dedicated = dedicated
+        self.last_run = 0.0
+
+
+_tasks: List[RefreshTask] = []
+_threads: List[threading.Thread] = []
+
+
+def register(name: str, refresh: Callable[[Session], None], interval: float, dedicated: bool = False) -> None:
+    """
+    Register a refresh function to be run in the background
+
+    Args:
+        name: Name used in log messages
+        refresh: Callable taking a database session
+        interval: Seconds between runs
+        dedicated: Run on its own thread instead of the shared one
+    """
+    _tasks.append(RefreshTask(name, refresh, interval, dedicated))
+
+
+def run_task(task: RefreshTask) -> None:
+    """Run a single refresh task, logging (not raising) any failure."""
+    task.last_run = time.monotonic()
+    db = SessionLocal()
+    try:
+        task.refresh(db)
+    except Exception as e:
+        logger.error(f"Background refresh '{task.name}' failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def _run_forever(dedicated: Optional[RefreshTask] = None) -> None:
+    while True:
+        now = time.monotonic()
+        for task in [dedicated] if dedicated else [task for task in _tasks if not task.dedicated]:
+            if not task.last_run or now - task.last_run >= task.interval:
+                run_task(task)
+        time.sleep(1)
+
+
+def start() -> None:
+    """Start the refresh threads for this worker (idempotent)."""
+    if _threads:
+        return
+    _threads.append(threading.Thread(target=_run_forever, name="catalog-refresh", daemon=True))
+    for task in _tasks:
+        if task.dedicated:
+            _threads.append(threading.Thread(
+                target=_run_forever, args=(task,), name=f"catalog-refresh-{task.name}", daemon=True
+            ))
+    for thread in _threads:
+        thread.start()
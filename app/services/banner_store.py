@@ -0,0 +1,132 @@
+"""
+Per-worker snapshot of active banners (oc_banner with oc_banner_image).
+
+An OpenCart banner is a group of slides. Active banners and their
+default-language images are loaded with one query, the images eagerly
+joined, and rendered to the /banners entries and the slides home sections
+show. The tables are tiny and have no date_modified, so the refresher
+reloads them on every poll and only swaps in a new snapshot, with freshly
+encoded response bodies, when the rendered content changed. Requests never
+query.
+"""
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, contains_eager
+
+from app import models
+from app.core.precompressed import EncodedPayload, encode_payload
+from app.services.item_cards import item_cards
+from app.services.item_details import IMAGE_URL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# OpenCart link parameters -> app search filter parameters
+BANNER_FILTER_PARAMS = {
+    "search": "q",
+    "category_id": "categoryId",
+    "author_id": "authorId",
+    "publisher_id": "publisherId"
+}
+
+
+def banner_link(link: Optional[str]) -> Tuple[str, Optional[int], Optional[str]]:
+    """(linkType, product_id, searchFilter) for an OpenCart banner link."""
+    params = dict(parse_qsl(urlsplit(link or "").query))
+    if params.get("product_id", "").isdigit():
+        return "ITEM", int(params["product_id"]), None
+    if "path" in params and "category_id" not in params:
+        # path=20_27 is the category trail; the last id is the category shown
+        params["category_id"] = params["path"].split("_")[-1]
+    search_filter = urlencode([
+        (name, params[key]) for key, name in BANNER_FILTER_PARAMS.items() if params.get(key)
+    ])
+    if search_filter:
+        return "SEARCH_FILTER", None, search_filter
+    return "NONE", None, None
+
+
+class BannerSnapshot(NamedTuple):
+    banners: List[dict]  # /banners entries, by banner_id
+    slides: Dict[int, List[dict]]  # banner_id -> slides, in sort_order
+    payload: EncodedPayload  # the /banners response body
+    payloads: Dict[int, EncodedPayload]  # banner_id -> the /banners/{id} response body
+    fingerprint: str
+
+
+class BannerStore:
+    """Active banners with their slides, and their encoded response bodies."""
+
+    def __init__(self):
+        self._snapshot: Optional[BannerSnapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self, db: Session) -> None:
+        """Reload the banner tables; swap in a new snapshot only if they changed."""
+        banners = db.query(models.Banner).outerjoin(
+            models.BannerImage,
+            and_(
+                models.BannerImage.banner_id == models.Banner.banner_id,
+                models.BannerImage.language_id == 1  # Assuming language_id 1 is default
+            )
+        ).options(
+            contains_eager(models.Banner.images)
+        ).filter(models.Banner.status == True).order_by(
+            models.Banner.banner_id, models.BannerImage.sort_order, models.BannerImage.banner_image_id
+        ).populate_existing().all()
+
+        slides: Dict[int, List[Tuple]] = {}
+        for banner in banners:
+            slides[banner.banner_id] = [
+                (image.title or banner.name, image.image) + banner_link(image.link)
+                for image in banner.images
+                if image.image
+            ]
+        linked = [product_id for rows in slides.values() for *_, product_id, _ in rows if product_id]
+        item_ids = item_cards.item_ids(db, linked) if linked else {}
+        rendered = {
+            banner_id: [
+                {
+                    "name": name,
+                    "imageUrl": f"{IMAGE_URL_PREFIX}{image}",
+                    "linkType": link_type,
+                    "itemId": item_ids.get(product_id),
+                    "searchFilter": search_filter
+                }
+                for name, image, link_type, product_id, search_filter in rows
+            ]
+            for banner_id, rows in slides.items()
+        }
+
+        fingerprint = hashlib.sha1(repr(sorted(rendered.items())).encode("utf-8")).hexdigest()
+        if self._snapshot is not None and fingerprint == self._snapshot.fingerprint:
+            return
+        # A banner shows as its first slide; banners without images are left out
+        entries = [
+            {"bannerId": banner.banner_id, **rendered[banner.banner_id][0], "slides": rendered[banner.banner_id]}
+            for banner in banners
+            if rendered[banner.banner_id]
+        ]
+        self._snapshot = BannerSnapshot(
+            banners=entries,
+            slides={banner_id: rows for banner_id, rows in rendered.items() if rows},
+            payload=encode_payload(entries),
+            payloads={entry["bannerId"]: encode_payload(entry) for entry in entries},
+            fingerprint=fingerprint
+        )
+        logger.info(f"Banners loaded: {len(entries)} active")
+
+    def snapshot(self, db: Session) -> BannerSnapshot:
+        """The current snapshot, loaded on the spot if the refresher has not run yet."""
+        if self._snapshot is None:
+            self.refresh(db)
+        return self._snapshot
+
+
+banner_store = BannerStore()
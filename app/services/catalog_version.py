@@ -0,0 +1,72 @@
+"""
+Change detection for the product catalog.
+
+Caches derived from oc_product (counts, payloads) compare against
+catalog_version.version and treat anything recorded under an older version
+as stale. The version moves when the newest date_modified or the number of
+active products changes, or when bump() is called after a local write.
+
+Stock and view counts change without touching date_modified, so their
+totals over active products are tracked separately as `activity`. It does
+not move the version (that would rebuild every snapshot on each order) but
+feeds the HTTP validators of listings that show stock or sort by views.
+`stock` adds a product_id-weighted quantity sum, which also moves when a
+restock and a sale cancel out in the plain total.
+"""
+import logging
+import threading
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogVersion:
+    """Monotonic counter that moves whenever the catalog changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple] = None
+        self.version = 0
+        self.active_products: Optional[int] = None
+        # (total quantity, total views) over active products
+        self.activity: Optional[Tuple[int, int]] = None
+        # (total quantity, sum of product_id * quantity) over active products
+        self.stock: Optional[Tuple[int, int]] = None
+
+    @property
+    def signature(self) -> Optional[Tuple]:
+        """(newest date_modified, active products) as of the last poll; None before it."""
+        return self._signature
+
+    def bump(self) -> None:
+        """Invalidate everything derived from the catalog."""
+        with self._lock:
+            self.version += 1
+
+    def refresh(self, db: Session) -> None:
+        """Poll oc_product and bump the version if it changed."""
+        last_modified, active_products, quantity, weighted_quantity, viewed = db.query(
+            func.max(models.Product.date_modified),
+            func.sum(case((models.Product.status == 1, 1), else_=0)),
+            func.sum(case((models.Product.status == 1, models.Product.quantity), else_=0)),
+            func.sum(case((models.Product.status == 1, models.Product.product_id * models.Product.quantity), else_=0)),
+            func.sum(case((models.Product.status == 1, models.Product.viewed), else_=0))
+        ).one()
+        signature = (last_modified, int(active_products or 0))
+        with self._lock:
+            self.active_products = signature[1]
+            self.activity = (int(quantity or 0), int(viewed or 0))
+            self.stock = (int(quantity or 0), int(weighted_quantity or 0))
+            if signature != self._signature:
+                if self._signature is not None:
+                    logger.info(f"Catalog changed, version {self.version + 1}")
+                self._signature = signature
+                self.version += 1
+
+
+catalog_version = CatalogVersion()
@@ -0,0 +1,230 @@
+"""
+In-memory category tree built from oc_category and oc_category_description.
+
+Nodes are numbered in depth-first (nested-set) order, so the descendants of
+a category are one contiguous slice of that order and a subtree search
+filter expands without walking the tree. Each node also knows its parent,
+for breadcrumb paths, and the number of distinct active products in its
+subtree.
+
+oc_category is keyed by (category_id, parent_id); a category listed under
+several parents is placed under the lowest parent_id. Inactive categories
+are left out together with everything below them.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.catalog_version import catalog_version
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryNode(NamedTuple):
+    category_id: int
+    name: str
+    parent_id: int  # 0 for top-level categories
+    depth: int
+    left: int  # position in depth-first order
+    right: int  # one past the position of the last descendant
+    product_count: int  # distinct active products in the subtree
+
+
+class CategoryTree:
+    """Nested-set numbered category tree with names and subtree counts."""
+
+    def __init__(self, max_age: float = 10 * 60):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._nodes: Dict[int, CategoryNode] = {}
+        self._order: List[int] = []
+        self._children: Dict[int, List[int]] = {}
+        self._signature: Optional[Tuple] = None
+        # Hash of the built tree, so HTTP validators change exactly when it does
+        self.fingerprint: Optional[str] = None
+        self._built_at = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when categories or the catalog changed, or the snapshot is old."""
+        last_modified = db.query(func.max(models.Category.date_modified)).scalar()
+        signature = (last_modified, catalog_version.version)
+        if not self.ready or signature != self._signature or time.monotonic() - self._built_at >= self.max_age:
+            self.rebuild(db)
+            self._signature = signature
+
+    def rebuild(self, db: Session) -> None:
+        parents: Dict[int, int] = {}
+        active: Dict[int, Tuple[int, int]] = {}  # category_id -> (sort_order, parent_id)
+        inactive: Set[int] = set()
+        for category_id, parent_id, sort_order, status in db.query(
+            models.Category.category_id,
+            models.Category.parent_id,
+            models.Category.sort_order,
+            models.Category.status
+        ).order_by(models.Category.category_id, models.Category.parent_id):
+            if not status:
+                inactive.add(category_id)
+            elif category_id not in active:
+                active[category_id] = (sort_order or 0, parent_id or 0)
+        names = dict(
+            db.query(models.CategoryDescription.category_id, models.CategoryDescription.name).filter(
+                models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        )
+
+        children: Dict[int, List[int]] = {0: []}
+        for category_id, (_, parent_id) in active.items():
+            if parent_id in inactive:
+                continue
+            # A parent that does not exist at all leaves the category at the top
+            if parent_id != 0 and parent_id not in active:
+                parent_id = 0
+            parents[category_id] = parent_id
+            children.setdefault(parent_id, []).append(category_id)
+        for siblings in children.values():
+            siblings.sort(key=lambda cid: (active[cid][0], names.get(cid) or "", cid))
+
+        # Depth-first numbering from the top level; anything left unvisited
+        # sits on a parent cycle and is dropped
+        order: List[int] = []
+        spans: Dict[int, Tuple[int, int, int]] = {}  # category_id -> (depth, left, right)
+        stack: List[Tuple[int, int, bool]] = [(cid, 0, False) for cid in reversed(children[0])]
+        while stack:
+            category_id, depth, closing = stack.pop()
+            if closing:
+                spans[category_id] = (depth, spans[category_id][1], len(order))
+                continue
+            if category_id in spans:
+                continue
+            spans[category_id] = (depth, len(order), len(order))
+            order.append(category_id)
+            stack.append((category_id, depth, True))
+            for child in reversed(children.get(category_id, ())):
+                stack.append((child, depth + 1, False))
+
+        counts = self._count_products(db, parents, spans)
+        nodes = {
+            category_id: CategoryNode(
+                category_id=category_id,
+                name=names.get(category_id) or f"Category {category_id}",
+                parent_id=parents[category_id],
+                depth=depth,
+                left=left,
+                right=right,
+                product_count=counts.get(category_id, 0)
+            )
+            for category_id, (depth, left, right) in spans.items()
+        }
+
+        fingerprint = hashlib.sha1(repr([nodes[cid] for cid in order]).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            self._nodes = nodes
+            self._order = order
+            self.fingerprint = fingerprint
+            self._children = {parent: [cid for cid in kids if cid in nodes] for parent, kids in children.items()}
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Category tree built: {len(nodes)} categories")
+
+    @staticmethod
+    def _count_products(db: Session, parents: Dict[int, int], spans: Dict) -> Dict[int, int]:
+        """Distinct active products per subtree, in one pass over product links."""
+        counts: Dict[int, int] = {}
+        current_product = None
+        counted: Set[int] = set()
+        for product_id, category_id in db.query(
+            models.ProductToCategory.product_id, models.ProductToCategory.category_id
+        ).join(
+            models.Product, models.Product.product_id == models.ProductToCategory.product_id
+        ).filter(models.Product.status == 1).order_by(models.ProductToCategory.product_id):
+            if product_id != current_product:
+                current_product = product_id
+                counted = set()
+            # Walk up to the root, stopping at nodes this product already counted for
+            while category_id in spans and category_id not in counted:
+                counted.add(category_id)
+                counts[category_id] = counts.get(category_id, 0) + 1
+                category_id = parents[category_id]
+        return counts
+
+    # Lookups
+
+    def node(self, category_id: int) -> Optional[CategoryNode]:
+        return self._nodes.get(category_id)
+
+    def name(self, category_id: int) -> Optional[str]:
+        node = self._nodes.get(category_id)
+        return node.name if node else None
+
+    def breadcrumbs(self, category_id: int) -> List[CategoryNode]:
+        """Path from the top level down to the category, inclusive."""
+        path = []
+        node = self._nodes.get(category_id)
+        while node is not None:
+            path.append(node)
+            node = self._nodes.get(node.parent_id)
+        return path[::-1]
+
+    def expand(self, category_ids: Iterable[int]) -> Set[int]:
+        """
+        Categories plus all their descendants
+
+        Ids the tree does not know (inactive, or not built yet) are kept
+        as they are, so the filter never becomes broader than asked.
+        """
+        with self._lock:
+            expanded: Set[int] = set()
+            for category_id in category_ids:
+                node = self._nodes.get(category_id)
+                if node is None:
+                    expanded.add(category_id)
+                else:
+                    expanded.update(self._order[node.left:node.right])
+            return expanded
+
+    def to_dict(self, node: CategoryNode, max_depth: Optional[int] = None) -> dict:
+        item = {
+            "id": node.category_id,
+            "name": node.name,
+            "productCount": node.product_count,
+            "searchFilter": f"categoryId={node.category_id}"
+        }
+        if max_depth is None or max_depth > 0:
+            item["children"] = [
+                self.to_dict(self._nodes[child], None if max_depth is None else max_depth - 1)
+                for child in self._children.get(node.category_id, ())
+            ]
+        return item
+
+    def tree(self, root_id: Optional[int] = None, max_depth: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        Nested category listing
+
+        Args:
+            root_id: Return only this category's children (None for the top level)
+            max_depth: Levels to include below the returned nodes (None for all)
+
+        Returns:
+            List of nodes with nested "children", or None if root_id is unknown
+        """
+        with self._lock:
+            if root_id is not None and root_id not in self._nodes:
+                return None
+            return [
+                self.to_dict(self._nodes[child], max_depth)
+                for child in self._children.get(root_id or 0, ())
+            ]
+
+
+category_tree = CategoryTree()
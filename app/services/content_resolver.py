@@ -0,0 +1,126 @@
+"""
+Bulk rendering of content references (reference_type, reference_id), as
+stored in oc_layout_section_content.
+
+References are grouped by type and each type is fetched with one IN
+query (products come from the item card store and banners from the
+banner store), then reassembled in the caller's order. A section with
+40 category tiles costs one query, and a whole home feed of mixed
+sections costs at most one per type. Any list of mixed references can
+be resolved this way, e.g. campaign landing pages.
+
+Each reference renders to a list of entries: one for products,
+categories, authors and publishers, one per slide for banners.
+References to inactive or deleted rows render to nothing.
+"""
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.banner_store import banner_store
+from app.services.item_cards import item_cards
+from app.services.item_details import IMAGE_URL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# (reference_type, reference_id), e.g. ("PRODUCT", 42)
+Reference = Tuple[str, int]
+
+
+def _image_url(image: Optional[str]) -> Optional[str]:
+    return f"{IMAGE_URL_PREFIX}{image}" if image else None
+
+
+# Renderers: (db, ids) -> id -> entries, at most one query per call
+
+def _render_products(db: Session, ids: List[int]) -> Dict[int, List[dict]]:
+    return {product_id: [card] for product_id, card in item_cards.get_many(db, ids).items()}
+
+
+def _render_categories(db: Session, ids: List[int]) -> Dict[int, List[dict]]:
+    return {
+        category_id: [{
+            "name": name,
+            "imageUrl": _image_url(image),
+            "searchFilter": f"categoryId={category_id}"
+        }]
+        for category_id, name, image in db.query(
+            models.Category.category_id, models.CategoryDescription.name, models.Category.image
+        ).join(
+            models.CategoryDescription,
+            and_(
+                models.CategoryDescription.category_id == models.Category.category_id,
+                models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        ).filter(models.Category.category_id.in_(ids), models.Category.status == True)
+    }
+
+
+def _entity_renderer(model, key, parameter: str) -> Callable[[Session, List[int]], Dict[int, List[dict]]]:
+    def render(db: Session, ids: List[int]) -> Dict[int, List[dict]]:
+        return {
+            reference_id: [{
+                "name": name,
+                "imageUrl": _image_url(image),
+                "searchFilter": f"{parameter}={reference_id}"
+            }]
+            for reference_id, name, image in db.query(key, model.name, model.image).filter(
+                key.in_(ids), model.status == True
+            )
+        }
+    return render
+
+
+def _render_banners(db: Session, ids: List[int]) -> Dict[int, List[dict]]:
+    # A banner is a group of slides; each slide becomes one entry
+    slides = banner_store.snapshot(db).slides
+    return {banner_id: slides[banner_id] for banner_id in ids if banner_id in slides}
+
+
+RENDERERS: Dict[str, Callable[[Session, List[int]], Dict[int, List[dict]]]] = {
+    "PRODUCT": _render_products,
+    "CATEGORY": _render_categories,
+    "AUTHOR": _entity_renderer(models.Author, models.Author.author_id, "authorId"),
+    "PUBLISHER": _entity_renderer(models.Publisher, models.Publisher.publisher_id, "publisherId"),
+    "BANNER": _render_banners
+}
+
+
+def render_references(db: Session, references: Iterable[Reference]) -> Dict[Reference, List[dict]]:
+    """
+    Render references with one lookup per reference type
+
+    Args:
+        db: Database session
+        references: References in any order; duplicates are fetched once
+
+    Returns:
+        reference -> entries, for references that resolved
+    """
+    ids: Dict[str, List[int]] = {}
+    for reference_type, reference_id in references:
+        ids.setdefault(reference_type, []).append(reference_id)
+
+    rendered: Dict[Reference, List[dict]] = {}
+    for reference_type, type_ids in ids.items():
+        renderer = RENDERERS.get(reference_type)
+        if renderer is None:
+            logger.warning(f"Skipping content references of unknown type {reference_type}")
+            continue
+        for reference_id, entries in renderer(db, list(dict.fromkeys(type_ids))).items():
+            rendered[(reference_type, reference_id)] = entries
+    return rendered
+
+
+def assemble(references: Iterable[Reference], rendered: Dict[Reference, List[dict]]) -> List[dict]:
+    """Entries for references in the given order, from render_references() output."""
+    return [entry for reference in references for entry in rendered.get(reference, ())]
+
+
+def resolve_references(db: Session, references: List[Reference]) -> List[dict]:
+    """Render one list of references, keeping its order."""
+    return assemble(references, render_references(db, references))
+
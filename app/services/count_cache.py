@@ -0,0 +1,122 @@
+"""
+Total-count strategies for paginated catalog queries.
+
+Exact totals are cached per normalised filter signature with a TTL and are
+dropped as soon as catalog_version moves. The "estimate" mode stops
+counting at COUNT_ESTIMATE_CAP rows so very broad queries cost a bounded
+amount of work.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import func, literal
+
+from app.core.config import settings
+from app.services.catalog_version import catalog_version
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted({str(item).strip() for item in value}))
+    if isinstance(value, str):
+        return " ".join(value.casefold().split())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def filter_signature(scope: str, **filters: Any) -> Tuple:
+    """
+    Build a cache key for a filtered listing
+
+    Unset filters are dropped, id lists are de-duplicated and sorted, and
+    keywords are case-folded with whitespace collapsed, so equivalent
+    requests share one entry.
+
+    Args:
+        scope: Name of the listing (e.g. "search", "products")
+        **filters: The listing's filter parameters
+
+    Returns:
+        Hashable signature
+    """
+    return (scope,) + tuple(
+        (name, _normalize(value))
+        for name, value in sorted(filters.items())
+        if value is not None and value != [] and value is not False
+    )
+
+
+class CountCache:
+    """Bounded LRU of exact totals, tagged with the catalog version."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[int, float, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, signature: Tuple) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None:
+                count, expires_at, version = entry
+                if expires_at > time.monotonic() and version == catalog_version.version:
+                    self._entries.move_to_end(signature)
+                    self.hits += 1
+                    return count
+                del self._entries[signature]
+            self.misses += 1
+            return None
+
+    def set(self, signature: Tuple, count: int) -> None:
+        with self._lock:
+            self._entries[signature] = (count, time.monotonic() + self.ttl, catalog_version.version)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache(settings.COUNT_CACHE_TTL_SECONDS, settings.COUNT_CACHE_MAX_ENTRIES)
+
+
+def count_total(query, key_column, signature: Tuple, mode: str = "exact") -> Tuple[int, bool]:
+    """
+    Total for a filtered listing
+
+    Args:
+        query: Filtered Query whose joins are all one-to-one
+        key_column: Column to count (the listing's primary key)
+        signature: Result of filter_signature() for the same filters
+        mode: "exact" or "estimate"
+
+    Returns:
+        (total, is_estimate). In estimate mode the total is capped at
+        COUNT_ESTIMATE_CAP and flagged when the cap was reached.
+    """
+    cached = count_cache.get(signature)
+    if cached is not None:
+        return cached, False
+
+    if mode == "estimate":
+        cap = settings.COUNT_ESTIMATE_CAP
+        limited = query.with_entities(literal(1)).limit(cap + 1).subquery()
+        total = query.session.query(func.count()).select_from(limited).scalar()
+        if total > cap:
+            return cap, True
+    else:
+        total = query.with_entities(func.count(key_column)).scalar()
+
+    count_cache.set(signature, total)
+    return total, False
@@ -0,0 +1,417 @@
+"""
+In-memory facet index for the /items/search filter sheet.
+
+Holds, per active product, its price, stock state and category, author and
+publisher links, so facet counts for a search can be computed in one pass
+over the keyword match set without touching MySQL. Counts for the
+unfiltered catalog are kept up to date as products change.
+
+After the first build the index follows the tables it is made of:
+products whose date_modified moved are re-read together with their links
+(the admin moves date_modified when it saves a product's categories,
+authors or publishers), stock is re-read with one narrow scan when
+catalog_version's stock signal moves, and the small category, author and
+publisher name tables are reloaded every NAMES_MAX_AGE. A full rebuild
+runs every full_rebuild_interval to pick up anything else.
+"""
+import bisect
+import hashlib
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.catalog_version import catalog_version
+from app.services.item_cards import STOCK_SYNC_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Price bands offered in the filter sheet: (min, max), max exclusive, None = open
+PRICE_BANDS = [(0, 100), (100, 250), (250, 500), (500, 1000), (1000, None)]
+# Values returned per facet, highest count first
+FACET_VALUE_LIMIT = 20
+# Category, author and publisher names are reloaded this often
+NAMES_MAX_AGE = 10 * 60
+# More changed products than this in one poll are applied by a full rebuild
+MAX_INCREMENTAL_PRODUCTS = 10000
+# Facet -> (link table product column, link table value column)
+LINK_COLUMNS = {
+    "categories": (models.ProductToCategory.product_id, models.ProductToCategory.category_id),
+    "authors": (models.ProductAuthor.product_id, models.ProductAuthor.author_id),
+    "publishers": (models.ProductPublisher.product_id, models.ProductPublisher.publisher_id),
+}
+
+
+class FacetFilters(NamedTuple):
+    """The search filters that facets are computed against."""
+    category_ids: Optional[Set[int]] = None
+    author_ids: Optional[Set[int]] = None
+    publisher_ids: Optional[Set[int]] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    in_stock_only: bool = False
+
+
+def _band(price: float) -> Optional[int]:
+    for i, (low, high) in enumerate(PRICE_BANDS):
+        if price >= low and (high is None or price < high):
+            return i
+    return None
+
+
+def _sampled(product_id: int, cutoff: int) -> bool:
+    # Multiplicative hashing scatters ids evenly over 32 bits, so keeping
+    # those below the cutoff draws from old and new products alike
+    return (product_id * 2654435761) & 0xFFFFFFFF < cutoff
+
+
+class FacetIndex:
+    """Per-product facet attributes plus catalog-wide counts."""
+
+    def __init__(self, full_rebuild_interval: float = 6 * 60 * 60, max_scan: int = 20000):
+        self.full_rebuild_interval = full_rebuild_interval
+        self.max_scan = max_scan
+        self._lock = threading.Lock()
+        self._price: Dict[int, float] = {}
+        # Active product ids in ascending order, for sampling; replaced, never edited
+        self._ids: List[int] = []
+        self._in_stock: Set[int] = set()
+        self._links: Dict[str, Dict[int, Tuple[int, ...]]] = {facet: {} for facet in LINK_COLUMNS}
+        self._names: Dict[str, Dict[int, str]] = {facet: {} for facet in LINK_COLUMNS}
+        # Unfiltered catalog counts, kept current per changed product
+        self._counts: Dict[str, Dict[int, int]] = {facet: {} for facet in LINK_COLUMNS}
+        self._band_counts = [0] * len(PRICE_BANDS)
+        self._in_stock_count = 0
+        self._catalog_facets: Optional[dict] = None
+        self._watermark: Optional[datetime] = None
+        self._seen_at_watermark: Set[Tuple[int, datetime]] = set()
+        self._stock_signal: Optional[Tuple[int, int]] = None
+        self._stock_synced_at = 0.0
+        self._names_fingerprint: Optional[str] = None
+        self._names_loaded_at = 0.0
+        self._built_at = 0.0
+        # Identifies the indexed content, for HTTP validators
+        self.signature: Optional[Tuple] = None
+        self.ready = False
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when stale, otherwise apply changed products, stock and names."""
+        if not self.ready or time.monotonic() - self._built_at >= self.full_rebuild_interval:
+            self.rebuild(db)
+            return
+        if not self.update(db):
+            return
+        self.sync_stock(db)
+        if time.monotonic() - self._names_loaded_at >= NAMES_MAX_AGE:
+            self._set_names(self._load_names(db))
+
+    # Loading
+
+    @staticmethod
+    def _load_links(db: Session, facet: str, product_ids: Optional[List[int]] = None) -> Dict[int, Tuple[int, ...]]:
+        product_column, value_column = LINK_COLUMNS[facet]
+        query = db.query(product_column, value_column)
+        if product_ids is not None:
+            query = query.filter(product_column.in_(product_ids))
+        grouped: Dict[int, List[int]] = {}
+        for product_id, value_id in query:
+            grouped.setdefault(product_id, []).append(value_id)
+        return {product_id: tuple(values) for product_id, values in grouped.items()}
+
+    @staticmethod
+    def _load_names(db: Session) -> Dict[str, Dict[int, str]]:
+        return {
+            "categories": dict(
+                db.query(models.Category.category_id, models.CategoryDescription.name).join(
+                    models.CategoryDescription,
+                    and_(
+                        models.Category.category_id == models.CategoryDescription.category_id,
+                        models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+                    )
+                ).filter(models.Category.status == True)
+            ),
+            "authors": dict(
+                db.query(models.Author.author_id, models.Author.name).filter(models.Author.status == True)
+            ),
+            "publishers": dict(
+                db.query(models.Publisher.publisher_id, models.Publisher.name).filter(models.Publisher.status == True)
+            ),
+        }
+
+    def rebuild(self, db: Session) -> None:
+        stock_signal = catalog_version.stock
+        price: Dict[int, float] = {}
+        in_stock: Set[int] = set()
+        watermark = None
+        for product_id, product_price, quantity, date_modified in db.query(
+            models.Product.product_id, models.Product.price, models.Product.quantity, models.Product.date_modified
+        ).filter(models.Product.status == 1):
+            price[product_id] = float(product_price)
+            if quantity > 0:
+                in_stock.add(product_id)
+            if date_modified and (watermark is None or date_modified > watermark):
+                watermark = date_modified
+        links = {
+            facet: {
+                product_id: values
+                for product_id, values in self._load_links(db, facet).items() if product_id in price
+            }
+            for facet in LINK_COLUMNS
+        }
+        names = self._load_names(db)
+
+        with self._lock:
+            self._price = price
+            self._ids = sorted(price)
+            self._in_stock = in_stock
+            self._links = links
+            self._counts = {facet: {} for facet in LINK_COLUMNS}
+            self._band_counts = [0] * len(PRICE_BANDS)
+            self._in_stock_count = 0
+            for product_id in price:
+                self._contribute(product_id, 1)
+            self._watermark = watermark
+            self._seen_at_watermark = set()
+            self._stock_signal = stock_signal
+            self._stock_synced_at = time.monotonic()
+            self._built_at = time.monotonic()
+        self._set_names(names)
+        self.ready = True
+        logger.info(f"Facet index built: {len(price)} products")
+
+    def update(self, db: Session) -> bool:
+        """
+        Apply products whose date_modified moved, with their links
+
+        Returns:
+            False if a full rebuild ran instead
+        """
+        if self._watermark is None:
+            self.rebuild(db)
+            return False
+        # >= so rows written in the same second as the watermark are not missed;
+        # rows already applied at that second are skipped
+        rows = db.query(
+            models.Product.product_id, models.Product.status, models.Product.price,
+            models.Product.quantity, models.Product.date_modified
+        ).filter(models.Product.date_modified >= self._watermark).all()
+        if not rows:
+            return True
+        changed = [row for row in rows if (row.product_id, row.date_modified) not in self._seen_at_watermark]
+        if len(changed) > MAX_INCREMENTAL_PRODUCTS:
+            self.rebuild(db)
+            return False
+        watermark = max(row.date_modified for row in rows)
+        seen = {(row.product_id, row.date_modified) for row in rows if row.date_modified == watermark}
+        if changed:
+            product_ids = [row.product_id for row in changed]
+            links = {facet: self._load_links(db, facet, product_ids) for facet in LINK_COLUMNS}
+            ids = list(self._ids)
+            with self._lock:
+                for row in changed:
+                    product_id = row.product_id
+                    if product_id in self._price:
+                        self._contribute(product_id, -1)
+                        del self._price[product_id]
+                        del ids[bisect.bisect_left(ids, product_id)]
+                        self._in_stock.discard(product_id)
+                        for facet in LINK_COLUMNS:
+                            self._links[facet].pop(product_id, None)
+                    if row.status == 1:
+                        self._price[product_id] = float(row.price)
+                        bisect.insort(ids, product_id)
+                        if row.quantity > 0:
+                            self._in_stock.add(product_id)
+                        for facet in LINK_COLUMNS:
+                            if product_id in links[facet]:
+                                self._links[facet][product_id] = links[facet][product_id]
+                        self._contribute(product_id, 1)
+                self._ids = ids
+                self._render_catalog()
+        with self._lock:
+            self._watermark = watermark
+            self._seen_at_watermark = seen
+        return True
+
+    def sync_stock(self, db: Session) -> None:
+        """Re-read stock for active products if the stock signal moved."""
+        stock_signal = catalog_version.stock
+        if stock_signal == self._stock_signal or time.monotonic() - self._stock_synced_at < STOCK_SYNC_SECONDS:
+            return
+        in_stock = {
+            product_id for product_id, quantity in db.query(models.Product.product_id, models.Product.quantity).filter(
+                models.Product.status == 1, models.Product.quantity > 0
+            ).yield_per(10000)
+        }
+        with self._lock:
+            in_stock &= self._price.keys()
+            self._in_stock = in_stock
+            self._in_stock_count = len(in_stock)
+            self._stock_signal = stock_signal
+            self._stock_synced_at = time.monotonic()
+            self._render_catalog()
+
+    def _set_names(self, names: Dict[str, Dict[int, str]]) -> None:
+        fingerprint = hashlib.sha1(
+            repr([sorted(names[facet].items()) for facet in LINK_COLUMNS]).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            self._names_loaded_at = time.monotonic()
+            if fingerprint == self._names_fingerprint:
+                return
+            self._names = names
+            self._names_fingerprint = fingerprint
+            self._render_catalog()
+
+    # Counting (callers hold the lock)
+
+    def _contribute(self, product_id: int, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) a product's share of the catalog counts."""
+        for facet, facet_counts in self._counts.items():
+            for value_id in self._links[facet].get(product_id, ()):
+                facet_counts[value_id] = facet_counts.get(value_id, 0) + sign
+        band = _band(self._price[product_id])
+        if band is not None:
+            self._band_counts[band] += sign
+        if product_id in self._in_stock:
+            self._in_stock_count += sign
+
+    def _render_catalog(self) -> None:
+        self._catalog_facets = self._render(self._counts, self._band_counts, self._in_stock_count)
+        self.signature = (self._watermark, self._stock_signal, self._names_fingerprint)
+
+    def _failed_filters(self, product_id: int, filters: FacetFilters) -> List[str]:
+        failed = []
+        for facet, wanted in (
+            ("categories", filters.category_ids),
+            ("authors", filters.author_ids),
+            ("publishers", filters.publisher_ids),
+        ):
+            if wanted and not wanted.intersection(self._links[facet].get(product_id, ())):
+                failed.append(facet)
+        price = self._price[product_id]
+        if (filters.price_min is not None and price < filters.price_min) or (
+            filters.price_max is not None and price > filters.price_max
+        ):
+            failed.append("priceBands")
+        if filters.in_stock_only and product_id not in self._in_stock:
+            failed.append("inStock")
+        return failed
+
+    def _compute(self, product_ids: Iterable[int], filters: FacetFilters, scale: float = 1.0) -> dict:
+        """
+        Count facet values in a single pass
+
+        Each facet is counted against every filter except its own, so a
+        multi-select facet still shows its alternatives. A product that
+        fails no filter counts for every facet; one that fails exactly one
+        filter counts only for that facet.
+        """
+        counts: Dict[str, Dict[int, int]] = {facet: {} for facet in LINK_COLUMNS}
+        band_counts = [0] * len(PRICE_BANDS)
+        in_stock_count = 0
+        for product_id in product_ids:
+            if product_id not in self._price:
+                continue
+            failed = self._failed_filters(product_id, filters)
+            if len(failed) > 1:
+                continue
+            only = failed[0] if failed else None
+            for facet, facet_counts in counts.items():
+                if only is None or only == facet:
+                    for value_id in self._links[facet].get(product_id, ()):
+                        facet_counts[value_id] = facet_counts.get(value_id, 0) + 1
+            if only is None or only == "priceBands":
+                band = _band(self._price[product_id])
+                if band is not None:
+                    band_counts[band] += 1
+            if (only is None or only == "inStock") and product_id in self._in_stock:
+                in_stock_count += 1
+        return self._render(counts, band_counts, in_stock_count, scale)
+
+    def _render(self, counts: Dict[str, Dict[int, int]], band_counts: List[int], in_stock_count: int, scale: float = 1.0) -> dict:
+        def scaled(count: int) -> int:
+            return int(round(count * scale))
+
+        result = {}
+        for facet, facet_counts in counts.items():
+            names = self._names[facet]
+            top = heapq.nlargest(
+                FACET_VALUE_LIMIT,
+                ((count, value_id) for value_id, count in facet_counts.items() if count > 0 and value_id in names)
+            )
+            filter_name = {"categories": "categoryId", "authors": "authorId", "publishers": "publisherId"}[facet]
+            result[facet] = [
+                {
+                    "id": value_id,
+                    "name": names[value_id],
+                    "count": scaled(count),
+                    "searchFilter": f"{filter_name}={value_id}"
+                }
+                for count, value_id in top
+            ]
+        result["priceBands"] = [
+            {"min": low, "max": high, "count": scaled(count)}
+            for (low, high), count in zip(PRICE_BANDS, band_counts)
+        ]
+        result["inStock"] = {"count": scaled(in_stock_count)}
+        return result
+
+    # Querying
+
+    def matching(self, product_ids: Iterable[int], filters: FacetFilters) -> Optional[List[int]]:
+        """
+        The products that pass every filter, or None if the index is not built
+
+        Lets a keyword match set too large for an IN list be filtered in
+        memory. Stock is as of the index's last stock sync.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            return [
+                product_id for product_id in product_ids
+                if product_id in self._price and not self._failed_filters(product_id, filters)
+            ]
+
+    def facets(self, product_ids: Optional[Set[int]], filters: FacetFilters) -> Optional[dict]:
+        """
+        Facet counts for a search
+
+        Args:
+            product_ids: Keyword match set, or None for the whole catalog
+            filters: Filters applied to the search
+
+        Returns:
+            Facet dict with an "isEstimate" flag, or None if the index is not built.
+            Match sets larger than max_scan are counted from a sample and scaled.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            if product_ids is None and filters == FacetFilters():
+                return dict(self._catalog_facets, isEstimate=False)
+            candidates: Collection[int] = self._ids if product_ids is None else product_ids
+        total = len(candidates)
+        if total <= self.max_scan:
+            with self._lock:
+                return dict(self._compute(candidates, filters), isEstimate=False)
+        if product_ids is None:
+            # An even stride over the sorted catalog ids
+            step = total / self.max_scan
+            sample = [candidates[int(i * step)] for i in range(self.max_scan)]
+        else:
+            # One pass over the match set, no sort
+            cutoff = self.max_scan * 2 ** 32 // total
+            sample = [product_id for product_id in candidates if _sampled(product_id, cutoff)]
+        with self._lock:
+            return dict(self._compute(sample, filters, total / max(len(sample), 1)), isEstimate=True)
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,225 @@
+"""
+Typo- and transliteration-tolerant term lookup for /items/search.
+
+Every term is reduced to a phonetic key: Tamil script is transliterated to
+Latin and both scripts are then folded the same way (no voicing or vowel
+length distinction, doubled letters collapsed), so "ponniyin selvan",
+"ponniyan selvan" and பொன்னியின் செல்வன் land on the same or nearby keys.
+Keys are indexed by padded trigrams. A query token gathers candidate keys
+from its trigrams and the candidates are reranked by bounded edit distance.
+
+Terms and keys are interned once and trigram postings are array("I") of key
+ids, so the index costs a few bytes per trigram occurrence. It stops
+accepting new keys at max_keys.
+"""
+import heapq
+import itertools
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Tuple
+
+# Tamil consonants (without their inherent vowel), independent vowels and
+# vowel signs, romanised without vowel length, which romanised spellings
+# mark inconsistently
+_TAMIL_CONSONANTS = {
+    "க": "k", "ங": "ng", "ச": "c", "ஞ": "nj", "ட": "t", "ண": "n", "த": "t", "ந": "n",
+    "ப": "p", "ம": "m", "ய": "y", "ர": "r", "ல": "l", "வ": "v", "ழ": "zh", "ள": "l",
+    "ற": "r", "ன": "n", "ஜ": "j", "ஷ": "sh", "ஸ": "s", "ஹ": "h",
+}
+_TAMIL_VOWELS = {
+    "அ": "a", "ஆ": "a", "இ": "i", "ஈ": "i", "உ": "u", "ஊ": "u", "எ": "e", "ஏ": "e",
+    "ஐ": "ai", "ஒ": "o", "ஓ": "o", "ஔ": "au", "ஃ": "k",
+}
+_TAMIL_VOWEL_SIGNS = {
+    "ா": "a", "ி": "i", "ீ": "i", "ு": "u", "ூ": "u", "ெ": "e", "ே": "e",
+    "ை": "ai", "ொ": "o", "ோ": "o", "ௌ": "au",
+}
+_TAMIL_VIRAMA = "்"
+
+# Applied in order to romanised text. Tamil script does not distinguish
+# voicing or aspiration, English-style spellings write long vowels as
+# "ee"/"oo", "ng" stands for ங்க, and ஹ is often written with க (Mohan,
+# மோகன்).
+_FOLDS = [
+    ("zh", "l"), ("sh", "s"), ("ch", "s"), ("th", "t"), ("dh", "t"), ("ph", "p"),
+    ("bh", "p"), ("kh", "k"), ("gh", "k"), ("ng", "nk"), ("nj", "n"),
+    ("ee", "i"), ("oo", "u"), ("aa", "a"), ("ii", "i"), ("uu", "u"),
+]
+_LETTER_FOLDS = str.maketrans({
+    "g": "k", "d": "t", "b": "p", "c": "s", "j": "s", "z": "s", "f": "p", "q": "k", "w": "v", "h": "k",
+})
+
+# Candidates reranked by edit distance per query token
+MAX_CANDIDATES = 200
+# Index terms a single query token may expand to
+MAX_EXPANSIONS = 20
+
+
+def transliterate(token: str) -> str:
+    """Romanise Tamil letters in a token; other characters pass through."""
+    out: List[str] = []
+    pending_vowel = False  # last consonant still carries its inherent "a"
+    for char in token:
+        if char in _TAMIL_CONSONANTS:
+            if pending_vowel:
+                out.append("a")
+            out.append(_TAMIL_CONSONANTS[char])
+            pending_vowel = True
+        elif char in _TAMIL_VOWEL_SIGNS:
+            out.append(_TAMIL_VOWEL_SIGNS[char])
+            pending_vowel = False
+        elif char == _TAMIL_VIRAMA:
+            pending_vowel = False
+        else:
+            if pending_vowel:
+                out.append("a")
+                pending_vowel = False
+            out.append(_TAMIL_VOWELS.get(char, char))
+    if pending_vowel:
+        out.append("a")
+    return "".join(out)
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Script-neutral spelling key for a normalised search token
+
+    Args:
+        token: Output of search_index.tokenize()
+
+    Returns:
+        Folded romanisation; empty if nothing is left
+    """
+    text = transliterate(token)
+    # Drop Latin diacritics (ā, ī, ṉ ...) used in scholarly romanisation
+    text = "".join(
+        char for char in unicodedata.normalize("NFD", text) if not unicodedata.combining(char)
+    )
+    for source, target in _FOLDS:
+        text = text.replace(source, target)
+    text = text.translate(_LETTER_FOLDS)
+    folded: List[str] = []
+    for char in text:
+        if not folded or folded[-1] != char:
+            folded.append(char)
+    return "".join(folded)
+
+
+def max_distance(key: str) -> int:
+    """Edit distance tolerated for a key of this length."""
+    if len(key) < 3:
+        return 0
+    return 1 if len(key) < 6 else 2
+
+
+def trigrams(key: str) -> List[str]:
+    padded = f"${key}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    # Only cells within `limit` of the diagonal can lead to a distance <= limit
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        current = [i if i <= limit else over] + [over] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+        if min(current) > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+class FuzzyIndex:
+    """Phonetic key -> index terms, with a trigram index over the keys."""
+
+    def __init__(self, max_keys: int = 500000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._key_ids: Dict[str, int] = {}
+        self._key_terms: List[Tuple[str, ...]] = []
+        self._grams: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def build(self, terms: Iterable[str]) -> None:
+        """Replace the index with the given terms."""
+        fresh = FuzzyIndex(self.max_keys)
+        fresh.add(terms)
+        with self._lock:
+            self._keys = fresh._keys
+            self._key_ids = fresh._key_ids
+            self._key_terms = fresh._key_terms
+            self._grams = fresh._grams
+
+    def add(self, terms: Iterable[str]) -> None:
+        """Index new terms; terms already present are ignored."""
+        with self._lock:
+            for term in terms:
+                key = phonetic_key(term)
+                if not key:
+                    continue
+                key_id = self._key_ids.get(key)
+                if key_id is None:
+                    if len(self._keys) >= self.max_keys:
+                        continue
+                    key_id = len(self._keys)
+                    self._keys.append(key)
+                    self._key_ids[key] = key_id
+                    self._key_terms.append((term,))
+                    for gram in set(trigrams(key)):
+                        self._grams.setdefault(gram, array("I")).append(key_id)
+                elif term not in self._key_terms[key_id]:
+                    self._key_terms[key_id] += (term,)
+
+    def similar(self, token: str) -> List[Tuple[str, int]]:
+        """
+        Index terms that sound or are spelled like a query token
+
+        Args:
+            token: Normalised query token
+
+        Returns:
+            (term, edit distance between phonetic keys) pairs, closest first
+        """
+        key = phonetic_key(token)
+        if not key:
+            return []
+        limit = max_distance(key)
+        with self._lock:
+            key_id = self._key_ids.get(key)
+            if limit == 0:
+                return [(term, 0) for term in self._key_terms[key_id]] if key_id is not None else []
+
+            # A key within distance d of the query shares at least
+            # len(grams) - 3d of its padded trigrams
+            grams = set(trigrams(key))
+            shared = Counter(itertools.chain.from_iterable(self._grams.get(gram, ()) for gram in grams))
+            required = max(1, len(grams) - 3 * limit)
+            candidates = [
+                candidate
+                for candidate, count in heapq.nlargest(MAX_CANDIDATES, shared.items(), key=itemgetter(1))
+                if count >= required
+            ]
+            matches = []
+            for candidate in candidates:
+                distance = bounded_distance(key, self._keys[candidate], limit)
+                if distance <= limit:
+                    matches.extend((distance, term) for term in self._key_terms[candidate])
+        matches.sort()
+        return [(term, distance) for distance, term in matches[:MAX_EXPANSIONS]]
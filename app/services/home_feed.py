@@ -0,0 +1,58 @@
+"""
+Per-worker cache of assembled home feed documents (/app/home/feed).
+
+The feed is the whole home screen in one response, so it is cached as a
+unit, serialised and compressed (see app.core.precompressed). An entry
+is served while the validators it was built under (layout fingerprint,
+item card and pricing signatures) are unchanged and its TTL has not run
+out; the TTL bounds how long category, author, publisher and banner
+edits take to show, since those tables have no cheap validator.
+"""
+import threading
+import time
+from typing import Dict, Hashable, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.precompressed import EncodedPayload
+
+
+class FeedEntry(NamedTuple):
+    validators: Tuple
+    expires_at: float
+    payload: EncodedPayload
+
+
+class HomeFeedCache:
+    """Feed documents keyed by request options, tagged with their validators."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, FeedEntry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, validators: Tuple) -> Optional[FeedEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.validators == validators and entry.expires_at > time.monotonic():
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, validators: Tuple, payload: EncodedPayload) -> FeedEntry:
+        entry = FeedEntry(validators, time.monotonic() + self.ttl, payload)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+home_feed_cache = HomeFeedCache(settings.HOME_FEED_TTL_SECONDS)
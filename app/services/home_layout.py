@@ -0,0 +1,127 @@
+"""
+In-memory snapshot of the home page layout (oc_layout_section and
+oc_layout_section_content).
+
+The layout is read with one query (sections outer-joined to their content
+rows) into an immutable LayoutSnapshot, which is swapped in with a single
+assignment, so requests never see a half-built layout and never query.
+The /layout body is serialised and compressed once per build.
+The refresher polls a cheap signature (newest section date_modified, row
+counts and the newest content_id) and rebuilds only when it moves.
+oc_layout_section_content has no date_modified, so editing a content row
+in place shows up when its section is saved or after max_age at the latest.
+"""
+import hashlib
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.precompressed import EncodedPayload, encode_payload
+from app.services.content_resolver import Reference
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutSnapshot(NamedTuple):
+    sections: List[dict]  # metadata of visible sections, in display order
+    by_id: Dict[str, dict]  # sectionId -> metadata
+    references: Dict[str, List[Reference]]  # sectionId -> visible content, in order_sort
+    fingerprint: str  # hash of the above, for HTTP validators
+    payload: EncodedPayload  # the /layout response body
+
+
+def _section_metadata(section: models.LayoutSection) -> dict:
+    # oc_layout_section has no subtitle or per-item display columns; the
+    # defaults match what the app showed before the layout was data-driven
+    return {
+        "sectionId": str(section.section_id),
+        "displayType": section.display_type,
+        "contentType": section.content_type,
+        "title": section.title,
+        "showTitle": bool(section.show_title),
+        "subTitle": None,
+        "showSubTitle": False,
+        "showViewAll": bool(section.show_view_all),
+        "showName": True,
+        "showAuthor": section.content_type == "BOOK",
+        "order": section.order_sort,
+        "visible": True
+    }
+
+
+class HomeLayout:
+    """Visible home sections and their content references."""
+
+    def __init__(self, max_age: float = 10 * 60):
+        self.max_age = max_age
+        self._snapshot: Optional[LayoutSnapshot] = None
+        self._signature: Optional[Tuple] = None
+        self._built_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when the layout tables changed or the snapshot is old."""
+        signature = tuple(db.execute(select(
+            select(func.max(models.LayoutSection.date_modified)).scalar_subquery(),
+            select(func.count(models.LayoutSection.section_id)).scalar_subquery(),
+            select(func.count(models.LayoutSectionContent.content_id)).scalar_subquery(),
+            select(func.max(models.LayoutSectionContent.content_id)).scalar_subquery()
+        )).one())
+        if not self.ready or signature != self._signature or time.monotonic() - self._built_at >= self.max_age:
+            self.rebuild(db)
+            self._signature = signature
+
+    def rebuild(self, db: Session) -> None:
+        sections: List[dict] = []
+        references: Dict[str, List[Reference]] = {}
+        for section, reference_type, reference_id in db.query(
+            models.LayoutSection,
+            models.LayoutSectionContent.reference_type,
+            models.LayoutSectionContent.reference_id
+        ).outerjoin(
+            models.LayoutSectionContent,
+            and_(
+                models.LayoutSectionContent.section_id == models.LayoutSection.section_id,
+                models.LayoutSectionContent.visible == True
+            )
+        ).filter(models.LayoutSection.visible == True).order_by(
+            models.LayoutSection.order_sort,
+            models.LayoutSection.section_id,
+            models.LayoutSectionContent.order_sort,
+            models.LayoutSectionContent.content_id
+        ):
+            section_id = str(section.section_id)
+            if section_id not in references:
+                sections.append(_section_metadata(section))
+                references[section_id] = []
+            if reference_type is not None:
+                references[section_id].append((reference_type.upper(), reference_id))
+
+        fingerprint = hashlib.sha1(repr((sections, sorted(references.items()))).encode("utf-8")).hexdigest()
+        self._snapshot = LayoutSnapshot(
+            sections=sections,
+            by_id={section["sectionId"]: section for section in sections},
+            references=references,
+            fingerprint=fingerprint,
+            payload=encode_payload(sections)
+        )
+        self._built_at = time.monotonic()
+        logger.info(f"Home layout loaded: {len(sections)} sections")
+
+    def snapshot(self, db: Session) -> LayoutSnapshot:
+        """The current snapshot, loaded on the spot if the refresher has not run yet."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.rebuild(db)
+            snapshot = self._snapshot
+        return snapshot
+
+
+home_layout = HomeLayout()
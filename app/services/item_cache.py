@@ -0,0 +1,177 @@
+"""
+Read-through cache for assembled item detail payloads.
+
+The local tier is a per-worker LRU bounded by entry count and by the
+serialised size of its payloads. An optional shared tier in Redis
+(ITEM_CACHE_REDIS_URL, needs the redis package) lets gunicorn workers
+reuse each other's payloads.
+
+Entries carry the Product.date_modified they were built from, and a read
+asks for the version the caller holds as current (item_cards tracks it):
+a local entry at another version is a miss, and shared entries are keyed
+by product_id and version. A payload built from a row read just before
+an update can therefore never be served once the update is known,
+whichever worker wrote it. Entries expire after a TTL, which only bounds
+memory; stock and prices are not part of a payload.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # the shared tier is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class ProductDetail(NamedTuple):
+    """An assembled detail payload, without item id, prices, stock status and label."""
+    version: int  # Product.date_modified it was built from, as epoch seconds
+    base_price: float
+    payload: dict
+
+
+def _encode(detail: ProductDetail) -> bytes:
+    return json.dumps({
+        "v": detail.version,
+        "p": detail.base_price,
+        "d": detail.payload
+    }, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(raw: bytes) -> ProductDetail:
+    data = json.loads(raw)
+    return ProductDetail(data["v"], data["p"], data["d"])
+
+
+class ItemDetailCache:
+    """Bounded LRU of ProductDetail by product_id and version, with an optional Redis tier."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, shared_url: str = ""):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # product_id -> (detail, serialised size, expiry)
+        self._entries: "OrderedDict[int, Tuple[ProductDetail, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._shared = None
+        if shared_url:
+            if redis is None:
+                logger.warning("ITEM_CACHE_REDIS_URL is set but redis is not installed; shared tier disabled")
+            else:
+                self._shared = redis.Redis.from_url(shared_url)
+
+    @staticmethod
+    def _shared_key(product_id: int, version: int) -> str:
+        return f"item_detail:{product_id}:{version}"
+
+    def _discard(self, product_id: int) -> None:
+        entry = self._entries.pop(product_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _store(self, product_id: int, detail: ProductDetail, size: int) -> None:
+        with self._lock:
+            self._discard(product_id)
+            self._entries[product_id] = (detail, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_many(self, versions: Dict[int, int]) -> Dict[int, ProductDetail]:
+        """
+        Cached details at the given versions
+
+        Args:
+            versions: product_id -> current version (date_modified as
+                epoch seconds)
+
+        Returns:
+            product_id -> ProductDetail; absent ids are misses
+        """
+        found: Dict[int, ProductDetail] = {}
+        now = time.monotonic()
+        with self._lock:
+            for product_id, version in versions.items():
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    continue
+                if entry[2] > now and entry[0].version == version:
+                    self._entries.move_to_end(product_id)
+                    found[product_id] = entry[0]
+                else:
+                    self._discard(product_id)
+            self.hits += len(found)
+
+        missing = [product_id for product_id in versions if product_id not in found]
+        if missing and self._shared is not None:
+            try:
+                values = self._shared.mget([self._shared_key(product_id, versions[product_id]) for product_id in missing])
+            except redis.RedisError as e:
+                logger.warning(f"Shared item cache unavailable: {str(e)}")
+                values = []
+            for product_id, raw in zip(missing, values):
+                if raw:
+                    found[product_id] = _decode(raw)
+                    self._store(product_id, found[product_id], len(raw))
+                    self.shared_hits += 1
+        self.misses += len(versions) - len(found)
+        return found
+
+    def set_many(self, details: Dict[int, ProductDetail]) -> None:
+        """Add freshly built details to both tiers."""
+        encoded = {product_id: _encode(detail) for product_id, detail in details.items()}
+        for product_id, detail in details.items():
+            self._store(product_id, detail, len(encoded[product_id]))
+        if self._shared is not None and encoded:
+            try:
+                pipeline = self._shared.pipeline(transaction=False)
+                for product_id, raw in encoded.items():
+                    pipeline.setex(self._shared_key(product_id, details[product_id].version), int(self.ttl), raw)
+                pipeline.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Shared item cache unavailable: {str(e)}")
+
+    def invalidate(self, product_ids: Iterable[int]) -> None:
+        """Drop products from the local tier; shared entries of older versions are never read again."""
+        with self._lock:
+            for product_id in product_ids:
+                self._discard(product_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "hitRatio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            "sharedTier": self._shared is not None
+        }
+
+
+item_detail_cache = ItemDetailCache(
+    settings.ITEM_CACHE_MAX_ENTRIES,
+    settings.ITEM_CACHE_MAX_BYTES,
+    settings.ITEM_CACHE_TTL_SECONDS,
+    settings.ITEM_CACHE_REDIS_URL
+)
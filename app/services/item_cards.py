@@ -0,0 +1,365 @@
+"""
+Denormalised item cards for the list endpoints.
+
+A card is what every list surface shows for a product: item id, name,
+image, price and discount, stock status and the NEW_ARRIVAL label. The
+store keeps what cards are built from for every product in columnar
+arrays indexed by product_id (base price, stock state, date_added, and
+names and image paths in one UTF-8 buffer each), so a page of cards is
+read by id without a query. The item id comes from one_items_map, prices
+from pricing_engine and the label from date_added at read time, so those
+are always current. states() serves the same inputs to the item detail
+endpoint, which keys its payload cache by the stored date_modified and
+takes stock and label from here rather than from the cached payload.
+
+Products are kept current from oc_product.date_modified, which the admin
+also moves for description edits. Stock changes leave date_modified alone,
+so stock is re-read with one narrow scan when catalog_version's stock
+signal has moved, at most every STOCK_SYNC_SECONDS. The signal includes a
+product_id-weighted quantity sum, so a restock and a sale that cancel out
+in the plain total still trigger the scan. Ids the store does not
+know yet (new since the last poll, or everything before the first build)
+are read through from MySQL.
+"""
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.catalog_version import catalog_version
+from app.services.one_items import MAX_SPARSITY, grow_array, one_items_map
+from app.services.pricing import pricing_engine
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL_PREFIX = "https://assets2.panuval.com/image/cache/catalog/"
+# Items added within this many days are labelled NEW_ARRIVAL
+NEW_ARRIVAL_DAYS = 30
+
+# Stock is re-read at most this often, and only when the stock signal moved
+STOCK_SYNC_SECONDS = 60
+
+# Stock states; UNKNOWN slots are read through from MySQL
+UNKNOWN, INACTIVE, OUT_OF_STOCK, IN_STOCK = 0, 1, 2, 3
+
+# (base price, stock state, date_added and date_modified as epoch seconds or 0, name, image path)
+CardRow = Tuple[float, int, int, int, str, str]
+
+
+class CardState(NamedTuple):
+    """What an item detail payload takes from the card store."""
+    version: int  # Product.date_modified as epoch seconds, or 0
+    base_price: float
+    in_stock: bool
+    is_new: bool
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    return int(value.timestamp()) if value else 0
+
+
+def _stock_state(status, quantity) -> int:
+    if not status:
+        return INACTIVE
+    return IN_STOCK if quantity and quantity > 0 else OUT_OF_STOCK
+
+
+class _StringColumn:
+    """Strings in one UTF-8 buffer, addressed by slot."""
+
+    def __init__(self, size: int = 0):
+        self._data = bytearray()
+        self._start = array("I", bytes(4 * size))
+        self._length = array("I", bytes(4 * size))
+
+    def nbytes(self) -> int:
+        return len(self._data) + (len(self._start) + len(self._length)) * 4
+
+    def get(self, slot: int) -> str:
+        if slot >= len(self._start):
+            return ""
+        start = self._start[slot]
+        return self._data[start:start + self._length[slot]].decode("utf-8")
+
+    def set(self, slot: int, value: Optional[str]) -> None:
+        encoded = (value or "").encode("utf-8")
+        grow_array(self._start, slot + 1)
+        grow_array(self._length, slot + 1)
+        start, length = self._start[slot], self._length[slot]
+        if self._data[start:start + length] == encoded:
+            return
+        # Replaced values stay in the buffer until the next full rebuild
+        self._start[slot] = len(self._data)
+        self._length[slot] = len(encoded)
+        self._data += encoded
+
+
+class _CardColumns:
+    """One snapshot of the card inputs, indexed by product_id."""
+
+    def __init__(self, size: int = 0):
+        self.price = array("d", bytes(8 * size))
+        self.stock = array("b", bytes(size))
+        self.added = array("I", bytes(4 * size))
+        self.modified = array("I", bytes(4 * size))
+        self.names = _StringColumn(size)
+        self.images = _StringColumn(size)
+
+    def nbytes(self) -> int:
+        return (
+            len(self.price) * 8 + len(self.stock) + (len(self.added) + len(self.modified)) * 4
+            + self.names.nbytes() + self.images.nbytes()
+        )
+
+    def put(self, product_id: int, status, price, quantity, image, date_added, date_modified, name) -> None:
+        grow_array(self.price, product_id + 1)
+        grow_array(self.stock, product_id + 1)
+        grow_array(self.added, product_id + 1)
+        grow_array(self.modified, product_id + 1)
+        self.stock[product_id] = _stock_state(status, quantity)
+        if status:
+            self.price[product_id] = float(price or 0)
+            self.added[product_id] = _epoch(date_added)
+            self.modified[product_id] = _epoch(date_modified)
+            self.names.set(product_id, name)
+            self.images.set(product_id, image)
+
+    def get(self, product_id: int) -> Optional[CardRow]:
+        """The card inputs, INACTIVE-only rows for inactive products, or None if unknown."""
+        if not 0 <= product_id < len(self.stock) or self.stock[product_id] == UNKNOWN:
+            return None
+        state = self.stock[product_id]
+        if state == INACTIVE:
+            return (0.0, INACTIVE, 0, 0, "", "")
+        return (
+            self.price[product_id],
+            state,
+            self.added[product_id],
+            self.modified[product_id],
+            self.names.get(product_id),
+            self.images.get(product_id)
+        )
+
+
+class ItemCardStore:
+    """Card inputs for every product, read by id with read-through for misses."""
+
+    def __init__(self, full_rebuild_interval: float = 6 * 60 * 60):
+        self.full_rebuild_interval = full_rebuild_interval
+        self._lock = threading.Lock()
+        self._columns = _CardColumns()
+        self._watermark: Optional[datetime] = None
+        self._seen_at_watermark: Set[Tuple[int, datetime]] = set()
+        # catalog_version stock signal that the stock column reflects
+        self._stock_signal: Optional[Tuple[int, int]] = None
+        self._stock_synced_at = 0.0
+        self._built_at = 0.0
+        self.ready = False
+
+    def nbytes(self) -> int:
+        return self._columns.nbytes()
+
+    @property
+    def signature(self) -> Tuple:
+        """Identifies the stored content for HTTP validators."""
+        return (self._watermark, self._stock_signal)
+
+    @staticmethod
+    def _query(db: Session):
+        return db.query(
+            models.Product.product_id,
+            models.Product.status,
+            models.Product.price,
+            models.Product.quantity,
+            models.Product.image,
+            models.Product.date_added,
+            models.Product.date_modified,
+            models.ProductDescription.name
+        ).outerjoin(
+            models.ProductDescription,
+            and_(
+                models.Product.product_id == models.ProductDescription.product_id,
+                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        )
+
+    # Loading
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when stale, otherwise apply changed products and stock."""
+        if not self.ready or time.monotonic() - self._built_at >= self.full_rebuild_interval:
+            self.rebuild(db)
+        else:
+            self.update(db)
+            self.sync_stock(db)
+
+    def rebuild(self, db: Session) -> None:
+        rows, max_product_id = db.query(func.count(models.Product.product_id), func.max(models.Product.product_id)).one()
+        rows = rows or 0
+        if (max_product_id or 0) > MAX_SPARSITY * rows + 1000000:
+            logger.warning("Product ids are too sparse for the item card store; reading cards from MySQL")
+            return
+        stock_signal = catalog_version.stock
+        columns = _CardColumns((max_product_id or 0) + 1)
+        watermark = None
+        for product_id, status, price, quantity, image, date_added, date_modified, name in self._query(db).filter(
+            models.Product.status == 1
+        ).yield_per(10000):
+            columns.put(product_id, status, price, quantity, image, date_added, date_modified, name)
+            if date_modified and (watermark is None or date_modified > watermark):
+                watermark = date_modified
+        # Everything not loaded above is inactive or does not exist
+        for product_id, state in enumerate(columns.stock):
+            if state == UNKNOWN:
+                columns.stock[product_id] = INACTIVE
+        with self._lock:
+            self._columns = columns
+            self._watermark = watermark
+            self._seen_at_watermark = set()
+            self._stock_signal = stock_signal
+            self._stock_synced_at = time.monotonic()
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Item card store built: {rows} products, {self.nbytes() / 1048576:.1f} MiB")
+
+    def update(self, db: Session) -> None:
+        """Apply products whose date_modified moved since the last poll."""
+        if self._watermark is None:
+            self.rebuild(db)
+            return
+        # >= so rows written in the same second as the watermark are not missed;
+        # rows already applied at that second are skipped
+        rows = self._query(db).filter(models.Product.date_modified >= self._watermark).all()
+        if not rows:
+            return
+        changed = [row for row in rows if (row.product_id, row.date_modified) not in self._seen_at_watermark]
+        with self._lock:
+            for row in changed:
+                self._columns.put(*row)
+            watermark = max(row.date_modified for row in rows)
+            self._seen_at_watermark = {
+                (row.product_id, row.date_modified) for row in rows if row.date_modified == watermark
+            }
+            self._watermark = watermark
+
+    def sync_stock(self, db: Session) -> None:
+        """Re-read stock for active products if the stock signal moved."""
+        stock_signal = catalog_version.stock
+        if stock_signal == self._stock_signal or time.monotonic() - self._stock_synced_at < STOCK_SYNC_SECONDS:
+            return
+        columns = self._columns
+        # Single-byte writes from the refresher thread; readers see either state
+        for product_id, quantity in db.query(models.Product.product_id, models.Product.quantity).filter(
+            models.Product.status == 1
+        ).yield_per(10000):
+            if 0 <= product_id < len(columns.stock) and columns.stock[product_id] in (IN_STOCK, OUT_OF_STOCK):
+                columns.stock[product_id] = IN_STOCK if quantity > 0 else OUT_OF_STOCK
+        self._stock_signal = stock_signal
+        self._stock_synced_at = time.monotonic()
+
+    # Reading
+
+    def _read_through(self, db: Session, product_ids: List[int]) -> Dict[int, CardRow]:
+        columns = _CardColumns()
+        for row in self._query(db).filter(models.Product.product_id.in_(product_ids)):
+            columns.put(*row)
+            # Only a built store has been checked for id density
+            if self.ready:
+                with self._lock:
+                    self._columns.put(*row)
+        return {product_id: row for product_id in product_ids for row in [columns.get(product_id)] if row}
+
+    @staticmethod
+    def item_ids(db: Session, product_ids: List[int]) -> Dict[int, int]:
+        """product_id -> public item id, from one_items_map once it is loaded."""
+        if one_items_map.ready:
+            return {
+                product_id: one_items_map.product_to_item(product_id) or product_id
+                for product_id in product_ids
+            }
+        mapped = dict(
+            db.query(models.OneItems.oc_id, func.min(models.OneItems.id)).filter(
+                models.OneItems.oc_id.in_(product_ids)
+            ).group_by(models.OneItems.oc_id)
+        )
+        return {product_id: mapped.get(product_id, product_id) for product_id in product_ids}
+
+    def _rows(self, db: Session, product_ids: Iterable[int]) -> Dict[int, CardRow]:
+        """Card inputs for the active products among product_ids."""
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return {}
+        with self._lock:
+            rows = {product_id: self._columns.get(product_id) for product_id in product_ids}
+        missing = [product_id for product_id, row in rows.items() if row is None]
+        if missing:
+            rows.update(self._read_through(db, missing))
+        return {product_id: row for product_id, row in rows.items() if row and row[1] != INACTIVE}
+
+    def states(self, db: Session, product_ids: Iterable[int], now: Optional[datetime] = None) -> Dict[int, CardState]:
+        """
+        Version, base price, stock and label inputs for a batch of products
+
+        Args:
+            db: Database session, used only for ids the store does not know
+            product_ids: Products to read
+            now: Time to label at (defaults to now)
+
+        Returns:
+            product_id -> CardState, for active products
+        """
+        new_since = (now or datetime.now()).timestamp() - NEW_ARRIVAL_DAYS * 86400
+        return {
+            product_id: CardState(modified, price, state == IN_STOCK, bool(added) and added > new_since)
+            for product_id, (price, state, added, modified, _, _) in self._rows(db, product_ids).items()
+        }
+
+    def get_many(self, db: Session, product_ids: Iterable[int], now: Optional[datetime] = None) -> Dict[int, dict]:
+        """
+        Cards for a batch of products
+
+        Args:
+            db: Database session, used only for ids the store does not know
+                and, before one_items_map has loaded, for item ids
+            product_ids: Products to build cards for
+            now: Time to price and label at (defaults to now)
+
+        Returns:
+            product_id -> card, for active products
+        """
+        rows = self._rows(db, product_ids)
+        if not rows:
+            return {}
+
+        now = now or datetime.now()
+        new_since = now.timestamp() - NEW_ARRIVAL_DAYS * 86400
+        item_ids = self.item_ids(db, list(rows))
+        prices = pricing_engine.resolve(((product_id, row[0]) for product_id, row in rows.items()), db=db, now=now)
+        cards = {}
+        for product_id, (_, state, added, _, name, image) in rows.items():
+            price, original_price, discount_percentage = prices[product_id]
+            is_new = bool(added) and added > new_since
+            cards[product_id] = {
+                "itemId": item_ids[product_id],
+                "name": name,
+                "imageUrl": f"{IMAGE_URL_PREFIX}{image}" if image else None,
+                "price": price,
+                "originalPrice": original_price,
+                "discountPercentage": discount_percentage,
+                "stockStatus": "IN_STOCK" if state == IN_STOCK else "OUT_OF_STOCK",
+                "label": {
+                    "label": "NEW_ARRIVAL" if is_new else None,
+                    "showLabel": is_new,
+                    "labelType": "NEW_ARRIVAL" if is_new else "NONE"
+                }
+            }
+        return cards
+
+
+item_cards = ItemCardStore()
@@ -0,0 +1,310 @@
+"""
+Bulk assembly of item detail payloads (/items/{item_id}).
+
+Every part of the payload is fetched with one IN-query over all requested
+products, so assembling one item or a hundred costs the same fixed number
+of statements regardless of how many categories, authors, publishers or
+images each book has.
+
+Assembled payloads are kept in item_detail_cache, keyed by the
+date_modified they were built from, without their prices, stock status
+and label. Those come from pricing_engine and item_cards on every read,
+since stock changes do not move date_modified. item_validators() says
+what a payload depends on without assembling it, for conditional GETs.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session, load_only
+
+from app import models
+from app.core.fields import Fields, project, wants
+from app.services.item_cache import ProductDetail, item_detail_cache
+from app.services.item_cards import IMAGE_URL_PREFIX, CardState, item_cards
+from app.services.one_items import one_items_map
+from app.services.pricing import Price, pricing_engine
+
+# Fields a detail payload can be narrowed to with fields=
+DETAIL_FIELDS = (
+    "itemId", "title", "subTitle", "description", "coverImageUrl", "moreImages", "stockStatus",
+    "shortDescription", "details", "authors", "publishers", "categories", "highlights", "policyText",
+    "label", "price", "originalPrice", "discountPercentage"
+)
+# Payload field -> the oc_product / oc_product_description columns it is built from
+PRODUCT_COLUMNS = {
+    "coverImageUrl": ("image",),
+    "details": ("isbn", "sku", "model", "manufacturer_id", "weight", "height", "width", "length"),
+}
+DESCRIPTION_COLUMNS = {
+    "title": ("name",),
+    "description": ("description",),
+    "shortDescription": ("meta_description",),
+    "highlights": ("tag",),
+}
+
+
+def resolve_product_ids(db: Session, item_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Map public item ids to oc_product ids
+
+    Ids found in one_items map to their oc_id; any other id is taken to be
+    a product_id already. Answered from one_items_map once it is loaded.
+
+    Returns:
+        item_id -> product_id
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    if not item_ids:
+        return {}
+    if one_items_map.ready:
+        return {item_id: one_items_map.item_to_product(item_id) or item_id for item_id in item_ids}
+    mapped = dict(
+        db.query(models.OneItems.id, models.OneItems.oc_id).filter(models.OneItems.id.in_(item_ids))
+    )
+    return {item_id: mapped.get(item_id, item_id) for item_id in item_ids}
+
+
+def _group(rows: Iterable, key_index: int = 0) -> Dict[int, List]:
+    grouped: Dict[int, List] = {}
+    for row in rows:
+        grouped.setdefault(row[key_index], []).append(row)
+    return grouped
+
+
+def load_product_details(db: Session, product_ids: Iterable[int], fields: Fields = None) -> Dict[int, ProductDetail]:
+    """
+    Assemble detail payloads straight from the database
+
+    Only the columns the payload is built from are loaded. With a field
+    selection, columns and sub-queries for unselected fields are skipped
+    too and the payloads hold only the selected fields. Prices, stock
+    status and label are left to render_item().
+
+    Returns:
+        product_id -> ProductDetail, for active products with a
+        default-language description
+    """
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return {}
+
+    product_columns = {"product_id", "price", "date_modified"}
+    description_columns = {"product_id", "language_id"}
+    for field, columns in PRODUCT_COLUMNS.items():
+        if wants(fields, field):
+            product_columns.update(columns)
+    for field, columns in DESCRIPTION_COLUMNS.items():
+        if wants(fields, field):
+            description_columns.update(columns)
+
+    products = {
+        product.product_id: (product, description)
+        for product, description in db.query(models.Product, models.ProductDescription).join(
+            models.ProductDescription,
+            and_(
+                models.Product.product_id == models.ProductDescription.product_id,
+                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        ).options(
+            load_only(*(getattr(models.Product, column) for column in product_columns)),
+            load_only(*(getattr(models.ProductDescription, column) for column in description_columns))
+        ).filter(
+            models.Product.product_id.in_(product_ids),
+            models.Product.status == 1
+        )
+    }
+    if not products:
+        return {}
+    product_ids = list(products)
+
+    # oc_category can hold a category under several parents, hence distinct()
+    categories = {}
+    if wants(fields, "categories"):
+        categories = _group(
+            db.query(
+                models.ProductToCategory.product_id,
+                models.Category.category_id,
+                models.CategoryDescription.name
+            ).join(
+                models.Category, models.Category.category_id == models.ProductToCategory.category_id
+            ).outerjoin(
+                models.CategoryDescription,
+                and_(
+                    models.Category.category_id == models.CategoryDescription.category_id,
+                    models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+                )
+            ).filter(models.ProductToCategory.product_id.in_(product_ids)).distinct()
+        )
+    images = {}
+    if wants(fields, "moreImages"):
+        images = _group(
+            db.query(models.ProductImage.product_id, models.ProductImage.image).filter(
+                models.ProductImage.product_id.in_(product_ids)
+            ).order_by(models.ProductImage.sort_order, models.ProductImage.product_image_id)
+        )
+    authors = {}
+    if wants(fields, "authors"):
+        authors = _group(
+            db.query(models.ProductAuthor.product_id, models.Author).join(
+                models.Author, models.Author.author_id == models.ProductAuthor.author_id
+            ).filter(
+                models.ProductAuthor.product_id.in_(product_ids),
+                models.Author.status == True
+            )
+        )
+    publishers = {}
+    if wants(fields, "publishers"):
+        publishers = _group(
+            db.query(models.ProductPublisher.product_id, models.Publisher).join(
+                models.Publisher, models.Publisher.publisher_id == models.ProductPublisher.publisher_id
+            ).filter(
+                models.ProductPublisher.product_id.in_(product_ids),
+                models.Publisher.status == True
+            )
+        )
+
+    details: Dict[int, ProductDetail] = {}
+    for product_id, (product, description) in products.items():
+        # Each field is built only if selected, so no unloaded column is touched
+        payload = {}
+        if wants(fields, "title"):
+            payload["title"] = description.name
+        if wants(fields, "subTitle"):
+            payload["subTitle"] = None  # Assuming no subtitle in current model
+        if wants(fields, "description"):
+            payload["description"] = description.description
+        if wants(fields, "coverImageUrl"):
+            payload["coverImageUrl"] = f"{IMAGE_URL_PREFIX}{product.image}" if product.image else None
+        if wants(fields, "moreImages"):
+            payload["moreImages"] = [f"{IMAGE_URL_PREFIX}{image}" for _, image in images.get(product_id, ()) if image]
+        if wants(fields, "shortDescription"):
+            payload["shortDescription"] = description.meta_description or ""
+        if wants(fields, "details"):
+            payload["details"] = {
+                "ISBN": product.isbn,
+                "SKU": product.sku,
+                "Model": product.model,
+                "Manufacturer": str(product.manufacturer_id),
+                "Weight": str(product.weight),
+                "Height": str(product.height),
+                "Width": str(product.width),
+                "Length": str(product.length)
+            }
+        if wants(fields, "authors"):
+            payload["authors"] = [
+                {
+                    "id": author.author_id,
+                    "name": author.name,
+                    "imageUrl": f"{IMAGE_URL_PREFIX}{author.image}" if author.image else None,
+                    "searchFilter": f"authorId={author.author_id}"
+                }
+                for _, author in authors.get(product_id, ())
+            ]
+        if wants(fields, "publishers"):
+            payload["publishers"] = [
+                {
+                    "id": publisher.publisher_id,
+                    "name": publisher.name,
+                    "imageUrl": f"{IMAGE_URL_PREFIX}{publisher.image}" if publisher.image else None,
+                    "searchFilter": f"publisherId={publisher.publisher_id}"
+                }
+                for _, publisher in publishers.get(product_id, ())
+            ]
+        if wants(fields, "categories"):
+            seen_categories = set()
+            payload["categories"] = []
+            for _, category_id, name in categories.get(product_id, ()):
+                if category_id not in seen_categories:
+                    seen_categories.add(category_id)
+                    payload["categories"].append({
+                        "id": category_id,
+                        "name": name if name else f"Category {category_id}",
+                        "searchFilter": f"categoryId={category_id}"
+                    })
+        if wants(fields, "highlights"):
+            payload["highlights"] = description.tag.split(',') if description.tag else []
+        if wants(fields, "policyText"):
+            payload["policyText"] = None  # Would need policy configuration
+        version = int(product.date_modified.timestamp()) if product.date_modified else 0
+        details[product_id] = ProductDetail(version, float(product.price), payload)
+    return details
+
+
+def render_item(item_id: int, detail: ProductDetail, price: Price, state: CardState, fields: Fields = None) -> dict:
+    """Complete a cached payload with the requested item id and current price, stock and label."""
+    payload = {
+        "itemId": item_id,
+        **detail.payload,
+        "stockStatus": "IN_STOCK" if state.in_stock else "OUT_OF_STOCK",
+        "label": {
+            "label": "NEW_ARRIVAL" if state.is_new else None,
+            "showLabel": state.is_new,
+            "labelType": "NEW_ARRIVAL" if state.is_new else "NONE"
+        },
+        "price": price.price,
+        "originalPrice": price.original_price,
+        "discountPercentage": price.discount_percentage
+    }
+    return project({field: payload[field] for field in DETAIL_FIELDS if field in payload}, fields)
+
+
+def load_item_details(db: Session, items: Dict[int, int], fields: Fields = None) -> Dict[int, dict]:
+    """
+    Build detail payloads for a batch of items
+
+    Payloads come from item_detail_cache where present at the version
+    item_cards holds; the rest are assembled in one bulk pass and cached. With a field selection, cache
+    misses are assembled from just the selected fields and not cached,
+    since the cache only holds complete payloads.
+
+    Args:
+        db: Database session
+        items: item_id -> product_id, as returned by resolve_product_ids()
+        fields: Selected payload fields (None for all), see DETAIL_FIELDS
+
+    Returns:
+        item_id -> payload, for items whose product is active and has a
+        default-language description. Missing items are simply absent.
+    """
+    states = item_cards.states(db, items.values())
+    details = item_detail_cache.get_many({product_id: state.version for product_id, state in states.items()})
+    missing = set(states).difference(details)
+    if missing:
+        loaded = load_product_details(db, missing, fields)
+        if fields is None:
+            item_detail_cache.set_many(loaded)
+        details.update(loaded)
+
+    prices = pricing_engine.resolve(
+        ((product_id, detail.base_price) for product_id, detail in details.items()), db=db
+    )
+    return {
+        item_id: render_item(item_id, details[product_id], prices[product_id], states[product_id], fields)
+        for item_id, product_id in items.items()
+        if product_id in details
+    }
+
+
+def item_validators(db: Session, items: Dict[int, int]) -> Dict[int, Tuple]:
+    """
+    What each item's payload depends on, without assembling it
+
+    The version, base price, stock status and label are read from
+    item_cards, which is what load_item_details() keys its cache by and
+    renders with. Prices are resolved exactly as for the payload.
+
+    Args:
+        db: Database session
+        items: item_id -> product_id, as returned by resolve_product_ids()
+
+    Returns:
+        item_id -> validator tuple, for the items whose product is active
+    """
+    states = item_cards.states(db, items.values())
+    prices = pricing_engine.resolve(((product_id, state.base_price) for product_id, state in states.items()), db=db)
+    return {
+        item_id: (product_id, states[product_id].version, states[product_id].in_stock, states[product_id].is_new)
+        + tuple(prices[product_id])
+        for item_id, product_id in items.items()
+        if product_id in states
+    }
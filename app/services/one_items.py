@@ -0,0 +1,118 @@
+"""
+In-memory bidirectional map between one_items.id and oc_product.product_id.
+
+Both directions are dense array("I") tables indexed by id, with 0 marking
+an absent entry, so a lookup is one array index. Ids are auto-increment
+and close to dense, which keeps the tables at 4 bytes per id: about 24 MiB
+for 3 million one_items rows over 3 million products. If ids turn out too
+sparse for that (see MAX_SPARSITY) the map stays unloaded and callers keep
+querying one_items.
+
+New rows are picked up incrementally by id; a periodic full reload picks up
+deletions and edits.
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+# Refuse to load when the largest id exceeds this many times the row count
+MAX_SPARSITY = 8
+
+
+def grow_array(table: array, size: int) -> None:
+    if len(table) < size:
+        table.frombytes(bytes(table.itemsize * (size - len(table))))
+
+
+class OneItemsMap:
+    """one_items.id <-> oc_product.product_id, as dense arrays."""
+
+    def __init__(self, full_reload_interval: float = 6 * 60 * 60):
+        self.full_reload_interval = full_reload_interval
+        self._lock = threading.Lock()
+        self._item_to_product = array("I")
+        self._product_to_item = array("I")
+        self._rows = 0
+        self._max_item_id = 0
+        self._loaded_at = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def nbytes(self) -> int:
+        return (len(self._item_to_product) + len(self._product_to_item)) * self._item_to_product.itemsize
+
+    def refresh(self, db: Session) -> None:
+        """Reload when stale, otherwise add rows created since the last load."""
+        if not self.ready or time.monotonic() - self._loaded_at >= self.full_reload_interval:
+            self.reload(db)
+        else:
+            self.update(db)
+
+    def reload(self, db: Session) -> None:
+        rows, max_item_id, max_product_id = db.query(
+            func.count(models.OneItems.id), func.max(models.OneItems.id), func.max(models.OneItems.oc_id)
+        ).one()
+        rows = rows or 0
+        if max(max_item_id or 0, max_product_id or 0) > MAX_SPARSITY * rows + 1000000:
+            logger.warning("one_items ids are too sparse for the in-memory map; resolving through MySQL")
+            return
+        item_to_product = array("I", bytes(4 * ((max_item_id or 0) + 1)))
+        product_to_item = array("I", bytes(4 * ((max_product_id or 0) + 1)))
+        for item_id, product_id in db.query(models.OneItems.id, models.OneItems.oc_id).order_by(
+            models.OneItems.id.desc()
+        ).yield_per(10000):
+            if item_id > 0 and product_id and product_id > 0:
+                item_to_product[item_id] = product_id
+                # Descending ids: a product with several items ends up with its
+                # lowest one, as the min() subquery this replaces chose
+                product_to_item[product_id] = item_id
+        with self._lock:
+            self._item_to_product = item_to_product
+            self._product_to_item = product_to_item
+            self._rows = rows
+            self._max_item_id = max_item_id or 0
+            self._loaded_at = time.monotonic()
+            self.ready = True
+        logger.info(f"one_items map loaded: {rows} rows, {self.nbytes() / 1048576:.1f} MiB")
+
+    def update(self, db: Session) -> None:
+        new_rows = db.query(models.OneItems.id, models.OneItems.oc_id).filter(
+            models.OneItems.id > self._max_item_id
+        ).order_by(models.OneItems.id).all()
+        if not new_rows:
+            return
+        with self._lock:
+            for item_id, product_id in new_rows:
+                if not product_id or product_id <= 0:
+                    continue
+                grow_array(self._item_to_product, item_id + 1)
+                grow_array(self._product_to_item, product_id + 1)
+                self._item_to_product[item_id] = product_id
+                if not self._product_to_item[product_id]:
+                    self._product_to_item[product_id] = item_id
+            self._rows += len(new_rows)
+            self._max_item_id = new_rows[-1][0]
+
+    def item_to_product(self, item_id: int) -> Optional[int]:
+        """oc_id for a one_items id, or None if there is no such row."""
+        table = self._item_to_product
+        return (table[item_id] or None) if 0 <= item_id < len(table) else None
+
+    def product_to_item(self, product_id: int) -> Optional[int]:
+        """Lowest one_items id for a product, or None if it has none."""
+        table = self._product_to_item
+        return (table[product_id] or None) if 0 <= product_id < len(table) else None
+
+
+one_items_map = OneItemsMap()
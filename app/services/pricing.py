@@ -0,0 +1,255 @@
+"""
+Effective prices for catalog listings, item detail and the cart.
+
+Product specials (oc_product_special, per product) and store-wide offers
+(oc_offer: a percentage or fixed discount over a date window) are loaded
+into in-memory tables by the background refresher. resolve() prices a
+whole batch of products against them without touching MySQL: the lowest
+of the base price, the best current special and the best current offer
+wins. Offers do not stack.
+
+oc_offer rows have no product list, so applying one means discounting the
+whole catalog, cart totals included. That only happens with
+STORE_WIDE_OFFERS_ENABLED set; by default offers are listed by /offers
+and do not change prices.
+
+signature() identifies the prices resolve() currently produces, for HTTP
+validators: it changes when the loaded tables change and whenever a
+special or offer window opens or closes.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Specials are stored per customer group; guests and new accounts use the
+# store's default group
+DEFAULT_CUSTOMER_GROUP_ID = 1
+PERCENT_DISCOUNT_TYPES = {"percentage", "percent", "%"}
+FIXED_DISCOUNT_TYPES = {"fixed", "flat", "amount"}
+
+
+class Price(NamedTuple):
+    """Resolved price; original_price and discount_percentage are None when undiscounted."""
+    price: float
+    original_price: Optional[float] = None
+    discount_percentage: Optional[int] = None
+
+
+def _as_date(value) -> Optional[date]:
+    # OpenCart stores open-ended specials with a 0000-00-00 date, which the
+    # driver hands back as None or as the raw string
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _window_end(end) -> Optional[datetime]:
+    """First instant after a window ending at end, or None if it is open-ended."""
+    if isinstance(end, datetime):
+        return end + timedelta(microseconds=1)
+    if isinstance(end, date):
+        return datetime.combine(end + timedelta(days=1), time())
+    return None
+
+
+def _window_edges(start, end) -> List[datetime]:
+    """Instants at which _in_window(start, end, now) flips."""
+    edges = []
+    if isinstance(start, datetime):
+        edges.append(start)
+    elif isinstance(start, date):
+        edges.append(datetime.combine(start, time()))
+    window_end = _window_end(end)
+    if window_end is not None:
+        edges.append(window_end)
+    return edges
+
+
+def _in_window(start, end, now: datetime) -> bool:
+    if isinstance(start, datetime) or isinstance(end, datetime):
+        return (start is None or start <= now) and (end is None or now <= end)
+    today = now.date()
+    return (start is None or start <= today) and (end is None or today <= end)
+
+
+class PricingEngine:
+    """In-memory specials and offers, resolved per batch of products."""
+
+    def __init__(self, apply_offers: bool = False):
+        self.apply_offers = apply_offers
+        self._lock = threading.Lock()
+        # product_id -> [(price, date_start, date_end)], best priority first
+        self._specials: Dict[int, List[Tuple[float, Optional[date], Optional[date]]]] = {}
+        # [(is_percentage, value, start_date, end_date)]
+        self._offers: List[Tuple[bool, float, Optional[datetime], Optional[datetime]]] = []
+        # Sorted instants at which some special or offer starts or ends
+        self._edges: List[datetime] = []
+        self._fingerprint: Optional[str] = None
+        self.ready = False
+
+    def signature(self, now: Optional[datetime] = None) -> Optional[Tuple[str, int]]:
+        """
+        Identifies the current pricing, or None before the first load
+
+        Two calls return the same value only if every product resolves to
+        the same price: same tables, and no window opened or closed between.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            if self._fingerprint is None:
+                return None
+            return (self._fingerprint, bisect.bisect_right(self._edges, now))
+
+    def refresh(self, db: Session) -> None:
+        """Reload specials, and offers if they apply, that have not yet ended."""
+        today = date.today()
+        specials: Dict[int, List[Tuple[int, float, Optional[date], Optional[date]]]] = {}
+        for product_id, priority, price, date_start, date_end in db.query(
+            models.ProductSpecial.product_id,
+            models.ProductSpecial.priority,
+            models.ProductSpecial.price,
+            models.ProductSpecial.date_start,
+            models.ProductSpecial.date_end
+        ).filter(models.ProductSpecial.customer_group_id == DEFAULT_CUSTOMER_GROUP_ID):
+            date_end = _as_date(date_end)
+            if date_end is not None and date_end < today:
+                continue
+            specials.setdefault(product_id, []).append(
+                (priority or 0, float(price), _as_date(date_start), date_end)
+            )
+
+        offers = []
+        if self.apply_offers:
+            for offer in db.query(models.Offer).filter(models.Offer.status == True):
+                kind = (offer.discount_type or "").strip().lower()
+                if kind not in PERCENT_DISCOUNT_TYPES and kind not in FIXED_DISCOUNT_TYPES:
+                    logger.warning(f"Offer {offer.offer_id} has unknown discount_type {offer.discount_type!r}, ignored")
+                    continue
+                if not offer.discount_value or offer.discount_value <= 0:
+                    continue
+                if offer.end_date is not None and offer.end_date < datetime.now():
+                    continue
+                offers.append((kind in PERCENT_DISCOUNT_TYPES, float(offer.discount_value), offer.start_date, offer.end_date))
+
+        # Same rule as OpenCart: lowest priority number, then lowest price
+        specials = {
+            product_id: [(price, start, end) for _, price, start, end in sorted(rows)]
+            for product_id, rows in specials.items()
+        }
+        edges = [
+            edge
+            for rows in specials.values() for _, start, end in rows
+            for edge in _window_edges(start, end)
+        ]
+        edges.extend(edge for _, _, start, end in offers for edge in _window_edges(start, end))
+        edges.sort()
+        fingerprint = hashlib.sha1(repr((sorted(specials.items()), offers)).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            self._specials = specials
+            self._offers = offers
+            self._edges = edges
+            self._fingerprint = fingerprint
+            self.ready = True
+
+    def running_specials(self, now: Optional[datetime] = None) -> Dict[int, float]:
+        """product_id -> price of the special running at the given time (defaults to now)."""
+        now = now or datetime.now()
+        with self._lock:
+            specials = self._specials
+        running = {}
+        for product_id, rows in specials.items():
+            for price, start, end in rows:
+                if _in_window(start, end, now):
+                    running[product_id] = price
+                    break
+        return running
+
+    def special_ends(self, product_ids: Iterable[int], now: Optional[datetime] = None) -> Dict[int, datetime]:
+        """
+        When each product's running special stops applying
+
+        Returns:
+            product_id -> first instant after the special's window, for the
+            given products whose running special has an end date
+        """
+        now = now or datetime.now()
+        with self._lock:
+            specials = self._specials
+        ends = {}
+        for product_id in product_ids:
+            for _, start, end in specials.get(product_id, ()):
+                if _in_window(start, end, now):
+                    window_end = _window_end(end)
+                    if window_end is not None:
+                        ends[product_id] = window_end
+                    break
+        return ends
+
+    def running_offers(self, now: Optional[datetime] = None) -> List[Tuple[bool, float]]:
+        """(is_percentage, value) of the offers in effect at the given time (defaults to now)."""
+        now = now or datetime.now()
+        with self._lock:
+            return [
+                (is_percentage, value) for is_percentage, value, start, end in self._offers
+                if _in_window(start, end, now)
+            ]
+
+    def resolve(
+        self,
+        products: Iterable[Tuple[int, float]],
+        db: Optional[Session] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[int, Price]:
+        """
+        Price a batch of products
+
+        Args:
+            products: (product_id, base price) pairs
+            db: If given and the tables are not loaded yet, they are loaded
+                first; otherwise prices resolve undiscounted until then
+            now: Time to price at (defaults to now)
+
+        Returns:
+            product_id -> Price
+        """
+        if not self.ready and db is not None:
+            self.refresh(db)
+        now = now or datetime.now()
+        with self._lock:
+            specials = self._specials
+        offers = self.running_offers(now)
+
+        prices: Dict[int, Price] = {}
+        for product_id, base_price in products:
+            # Compared and returned at the 2 decimals shown, so a sub-cent
+            # remainder never reads as a discount
+            base_price = round(float(base_price), 2)
+            best = base_price
+            for special_price, start, end in specials.get(product_id, ()):
+                if _in_window(start, end, now):
+                    best = min(best, special_price)
+                    break
+            for is_percentage, value in offers:
+                best = min(best, base_price * (1 - value / 100) if is_percentage else base_price - value)
+            best = round(max(best, 0.0), 2)
+            if best < base_price:
+                prices[product_id] = Price(best, base_price, int(round(100 * (base_price - best) / base_price)))
+            else:
+                prices[product_id] = Price(base_price)
+        return prices
+
+
+pricing_engine = PricingEngine(settings.STORE_WIDE_OFFERS_ENABLED)
@@ -0,0 +1,237 @@
+"""
+Ranked promotional products for /promotions.
+
+A product is on promotion while one of its specials (oc_product_special)
+is running and its effective price is below the base price. Store-wide
+offers (oc_offer) have no product list, so they are not what puts a
+product in the feed; when STORE_WIDE_OFFERS_ENABLED is set they are
+applied when pricing it, and a special an offer beats shows the offer
+price.
+
+The ranking is one sorted list of rank keys (-discount percentage,
+-saving, product_id). A page is a bisection into that list after the
+cursor's key, so pages stay consistent across refreshes. A full build
+prices every product with a running special through the item card store,
+in batches of PRICE_BATCH. After that the refresher re-ranks only the
+products whose running special changed (edited, started or ended) and
+those whose date_modified moved, reading their base price and status
+from MySQL. Stock does not affect the ranking and is not tracked. The
+offers in effect apply to every product, so a change there, and the
+periodic full rebuild, re-rank everything. Cards are read at request
+time, so prices on a page are always current even if the ranking lags
+by one poll.
+
+The feed also keeps when each ranked product's special ends. page()
+skips products whose special ended since the last poll and leaves them
+out of the total, so a promotion that just closed never shows up, even
+before the refresher drops it.
+"""
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.item_cards import item_cards
+from app.services.pricing import Price, pricing_engine
+
+logger = logging.getLogger(__name__)
+
+# Products priced per item_cards.get_many call
+PRICE_BATCH = 5000
+
+# (-discount percentage, -saving, product_id); ascending order is best first
+RankKey = Tuple[int, float, int]
+
+
+def _rank_key(product_id: int, price: Price) -> Optional[RankKey]:
+    """The product's rank key, or None if it is not discounted."""
+    if not price.discount_percentage:
+        return None
+    return (-price.discount_percentage, -round(price.original_price - price.price, 2), product_id)
+
+
+class PromotionFeed:
+    """Products on promotion, ranked by discount."""
+
+    def __init__(self, full_rebuild_interval: float = 6 * 60 * 60):
+        self.full_rebuild_interval = full_rebuild_interval
+        self._lock = threading.Lock()
+        self._keys: List[RankKey] = []
+        self._ranked: Dict[int, RankKey] = {}
+        # product_id -> when its special ends, and the same instants sorted
+        self._ends: Dict[int, datetime] = {}
+        self._end_list: List[datetime] = []
+        # What the ranking was computed from
+        self._specials: Dict[int, float] = {}
+        self._offers: List[Tuple[bool, float]] = []
+        self._watermark: Optional[datetime] = None
+        self._seen_at_watermark: Set[Tuple[int, datetime]] = set()
+        self._built_at = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when stale or the offers changed, otherwise re-rank changed products."""
+        if (
+            not self.ready
+            or time.monotonic() - self._built_at >= self.full_rebuild_interval
+            or pricing_engine.running_offers() != self._offers
+        ):
+            self.rebuild(db)
+        else:
+            self.update(db)
+
+    def rebuild(self, db: Session) -> None:
+        started = time.monotonic()
+        # Load prices first so the ranking reflects them
+        if not pricing_engine.ready:
+            pricing_engine.refresh(db)
+        watermark = db.query(func.max(models.Product.date_modified)).scalar()
+        now = datetime.now()
+        specials = pricing_engine.running_specials(now)
+        offers = pricing_engine.running_offers(now)
+        product_ids = list(specials)
+        ranked: Dict[int, RankKey] = {}
+        for start in range(0, len(product_ids), PRICE_BATCH):
+            cards = item_cards.get_many(db, product_ids[start:start + PRICE_BATCH], now)
+            for product_id, card in cards.items():
+                key = _rank_key(product_id, Price(card["price"], card["originalPrice"], card["discountPercentage"]))
+                if key:
+                    ranked[product_id] = key
+        ends = pricing_engine.special_ends(ranked, now)
+        with self._lock:
+            self._keys = sorted(ranked.values())
+            self._ranked = ranked
+            self._ends = ends
+            self._end_list = sorted(ends.values())
+            self._specials = specials
+            self._offers = offers
+            self._watermark = watermark
+            self._seen_at_watermark = set()
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Promotions ranked: {len(ranked)} products in {time.monotonic() - started:.1f}s")
+
+    def update(self, db: Session) -> None:
+        """Re-rank products whose running special or product row changed."""
+        now = datetime.now()
+        specials = pricing_engine.running_specials(now)
+        changed = {
+            product_id for product_id in set(specials) | set(self._specials)
+            if specials.get(product_id) != self._specials.get(product_id)
+        }
+
+        # >= so rows written in the same second as the watermark are not missed;
+        # rows already applied at that second are skipped
+        rows = []
+        watermark, seen = self._watermark, self._seen_at_watermark
+        if watermark is not None:
+            rows = db.query(
+                models.Product.product_id, models.Product.status, models.Product.price, models.Product.date_modified
+            ).filter(models.Product.date_modified >= watermark).all()
+            if rows:
+                watermark = max(row.date_modified for row in rows)
+                seen = {(row.product_id, row.date_modified) for row in rows if row.date_modified == watermark}
+        products = {
+            row.product_id: row for row in rows
+            if (row.product_id, row.date_modified) not in self._seen_at_watermark and row.product_id in specials
+        }
+        changed -= set(products)
+        changed &= set(specials)
+        if changed:
+            products.update((row.product_id, row) for row in db.query(
+                models.Product.product_id, models.Product.status, models.Product.price, models.Product.date_modified
+            ).filter(models.Product.product_id.in_(changed)))
+        # Products whose special ended, or that left the specials, drop out
+        removed = (set(self._specials) - set(specials)) | {
+            product_id for product_id, row in products.items() if row.status != 1
+        }
+        prices = pricing_engine.resolve(
+            ((product_id, row.price) for product_id, row in products.items() if row.status == 1), now=now
+        )
+        self._apply(
+            removed | set(prices),
+            (_rank_key(product_id, price) for product_id, price in prices.items()),
+            pricing_engine.special_ends(prices, now)
+        )
+        with self._lock:
+            self._specials = specials
+            self._watermark = watermark
+            self._seen_at_watermark = seen
+
+    def _apply(self, product_ids: Set[int], keys: Iterable[Optional[RankKey]], ends: Dict[int, datetime]) -> None:
+        """Replace the rank keys and special ends of product_ids (key None: not discounted)."""
+        if not product_ids:
+            return
+        # Edited on copies (the refresher is the only writer) and swapped in
+        ranked = dict(self._ranked)
+        ordered = list(self._keys)
+        product_ends = dict(self._ends)
+        end_list = list(self._end_list)
+        for product_id in product_ids:
+            old = ranked.pop(product_id, None)
+            if old is not None:
+                del ordered[bisect.bisect_left(ordered, old)]
+            old_end = product_ends.pop(product_id, None)
+            if old_end is not None:
+                del end_list[bisect.bisect_left(end_list, old_end)]
+        for key in keys:
+            if key is not None:
+                product_id = key[2]
+                ranked[product_id] = key
+                bisect.insort(ordered, key)
+                if product_id in ends:
+                    product_ends[product_id] = ends[product_id]
+                    bisect.insort(end_list, ends[product_id])
+        with self._lock:
+            self._ranked = ranked
+            self._keys = ordered
+            self._ends = product_ends
+            self._end_list = end_list
+
+    def page(
+        self, after: Optional[Sequence], limit: int, now: Optional[datetime] = None
+    ) -> Tuple[List[int], Optional[RankKey], int]:
+        """
+        One page of the ranking, without products whose special has ended
+
+        Args:
+            after: Rank key to continue after, or None for the first page
+            limit: Page size
+            now: Time the specials are checked at (defaults to now)
+
+        Returns:
+            (product ids, rank key to continue after or None on the last
+            page, total promoted products)
+        """
+        now = now or datetime.now()
+        with self._lock:
+            keys, ends, end_list = self._keys, self._ends, self._end_list
+
+        def ended(key: RankKey) -> bool:
+            end = ends.get(key[2])
+            return end is not None and end <= now
+
+        position = bisect.bisect_right(keys, tuple(after)) if after else 0
+        product_ids: List[int] = []
+        while position < len(keys) and len(product_ids) < limit:
+            if not ended(keys[position]):
+                product_ids.append(keys[position][2])
+            position += 1
+        # Ended products right after the page are skipped now, so a page
+        # is only followed by another if something is left to show
+        while position < len(keys) and ended(keys[position]):
+            position += 1
+        last = keys[position - 1] if position < len(keys) else None
+        return product_ids, last, len(keys) - bisect.bisect_right(end_list, now)
+
+
+promotion_feed = PromotionFeed()
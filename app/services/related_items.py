@@ -0,0 +1,321 @@
+"""
+Precomputed related-item rails for item detail (/items/{item_id}/related).
+
+Three neighbour lists are built per product by the background refresher:
+
+- bought together: products that share orders with it, ranked by cosine
+  similarity of their order sets (co-orders / sqrt(orders_a * orders_b))
+- same author / same publisher: other active products by its authors or
+  publishers, most viewed first
+
+Each list keeps the top TOP_N product ids and is stored in CSR form: one
+flat array("I") of neighbour ids and an array of offsets indexed by
+product_id. A lookup is two array reads and a slice. Co-occurrence is
+rebuilt when new orders arrive, at most every REBUILD_INTERVAL; the author
+and publisher lists are rebuilt with it. The build scans two years of
+order lines, so it runs on its own refresh thread. With a shared Redis
+(ITEM_CACHE_REDIS_URL) only one worker builds: it publishes the CSR arrays
+and the other workers load them instead of repeating the scan.
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # sharing builds between workers is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Neighbours kept per product and list
+TOP_N = 20
+# Orders older than this do not count towards co-occurrence
+ORDER_LOOKBACK_DAYS = 730
+# Orders with more distinct products (bulk and institutional orders) are
+# skipped: they add many pairs and say little about taste
+MAX_ORDER_ITEMS = 30
+# Pairs bought together fewer times than this are treated as noise
+MIN_CO_ORDERS = 2
+# Rebuilds happen at most this often
+REBUILD_INTERVAL = 6 * 60 * 60
+# Redis hash holding the last published build, and the key a worker holds
+# while building; a lock left by a worker that died mid-build expires
+SHARED_KEY = "related_items"
+BUILD_LOCK_KEY = "related_items:building"
+BUILD_LOCK_SECONDS = 30 * 60
+
+
+class Neighbours:
+    """Top-N neighbour ids per product, in CSR form."""
+
+    def __init__(self, lists: Optional[Dict[int, List[int]]] = None):
+        lists = lists or {}
+        size = max(lists, default=0) + 2
+        self._offsets = array("I", bytes(4 * size))
+        self._ids = array("I")
+        position = 0
+        for product_id in range(size - 1):
+            self._offsets[product_id] = position
+            neighbours = lists.get(product_id)
+            if neighbours:
+                self._ids.extend(neighbours)
+                position += len(neighbours)
+        self._offsets[size - 1] = position
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def nbytes(self) -> int:
+        return (len(self._offsets) + len(self._ids)) * 4
+
+    def dump(self) -> Tuple[bytes, bytes]:
+        return self._offsets.tobytes(), self._ids.tobytes()
+
+    @classmethod
+    def load(cls, offsets: bytes, ids: bytes) -> "Neighbours":
+        neighbours = cls()
+        neighbours._offsets = array("I", offsets)
+        neighbours._ids = array("I", ids)
+        return neighbours
+
+    def get(self, product_id: int, limit: int = TOP_N) -> List[int]:
+        if not 0 <= product_id < len(self._offsets) - 1:
+            return []
+        start = self._offsets[product_id]
+        return self._ids[start:min(self._offsets[product_id + 1], start + limit)].tolist()
+
+
+def _top_by_group(links: Iterable[Tuple[int, int]], viewed: Dict[int, int]) -> Dict[int, List[int]]:
+    """For (product, group) links, each product's most viewed other products in its groups."""
+    members: Dict[int, List[int]] = {}
+    groups_of: Dict[int, List[int]] = {}
+    for product_id, group_id in links:
+        if product_id in viewed:
+            members.setdefault(group_id, []).append(product_id)
+            groups_of.setdefault(product_id, []).append(group_id)
+    # Each group's TOP_N + 1 most viewed members cover every member's list,
+    # since a member may have to skip itself
+    leaders = {
+        group_id: heapq.nlargest(TOP_N + 1, set(ids), key=lambda pid: (viewed[pid], -pid))
+        for group_id, ids in members.items()
+    }
+    result: Dict[int, List[int]] = {}
+    for product_id, group_ids in groups_of.items():
+        candidates = {pid for group_id in group_ids for pid in leaders[group_id] if pid != product_id}
+        if candidates:
+            result[product_id] = heapq.nlargest(TOP_N, candidates, key=lambda pid: (viewed[pid], -pid))
+    return result
+
+
+class RelatedItems:
+    """Bought-together, same-author and same-publisher neighbours per product."""
+
+    def __init__(self, rebuild_interval: float = REBUILD_INTERVAL, shared_url: str = ""):
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._bought_together = Neighbours()
+        self._same_author = Neighbours()
+        self._same_publisher = Neighbours()
+        self._last_order_id: Optional[int] = None
+        self._built_at = 0.0
+        self.ready = False
+        self._shared = None
+        if shared_url:
+            if redis is None:
+                logger.warning("ITEM_CACHE_REDIS_URL is set but redis is not installed; related items are built per worker")
+            else:
+                self._shared = redis.Redis.from_url(shared_url)
+
+    def nbytes(self) -> int:
+        return self._bought_together.nbytes() + self._same_author.nbytes() + self._same_publisher.nbytes()
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild if new orders arrived and the last build is old enough."""
+        if self.ready and time.monotonic() - self._built_at < self.rebuild_interval:
+            return
+        last_order_id = db.query(func.max(models.Order.order_id)).scalar()
+        if self.ready and last_order_id == self._last_order_id:
+            self._built_at = time.monotonic()
+            return
+        if self._shared is None:
+            self.rebuild(db, last_order_id)
+            return
+        if self._load_shared(last_order_id) or not self._claim_build():
+            # Another worker is building; its result is loaded on a later poll
+            return
+        try:
+            self.rebuild(db, last_order_id)
+            self._publish()
+        finally:
+            self._release_build()
+
+    def rebuild(self, db: Session, last_order_id: Optional[int] = None) -> None:
+        started = time.monotonic()
+        viewed = dict(
+            db.query(models.Product.product_id, models.Product.viewed).filter(models.Product.status == 1)
+        )
+        bought_together = self._co_occurrence(db, viewed)
+        same_author = _top_by_group(
+            db.query(models.ProductAuthor.product_id, models.ProductAuthor.author_id).join(
+                models.Author, models.Author.author_id == models.ProductAuthor.author_id
+            ).filter(models.Author.status == True),
+            viewed
+        )
+        same_publisher = _top_by_group(
+            db.query(models.ProductPublisher.product_id, models.ProductPublisher.publisher_id).join(
+                models.Publisher, models.Publisher.publisher_id == models.ProductPublisher.publisher_id
+            ).filter(models.Publisher.status == True),
+            viewed
+        )
+        with self._lock:
+            self._bought_together = Neighbours(bought_together)
+            self._same_author = Neighbours(same_author)
+            self._same_publisher = Neighbours(same_publisher)
+            self._last_order_id = last_order_id
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(
+            f"Related items built in {time.monotonic() - started:.1f}s: "
+            f"{len(bought_together)} products with co-purchases, {self.nbytes() / 1048576:.1f} MiB"
+        )
+
+    @staticmethod
+    def _order_key(last_order_id: Optional[int]) -> bytes:
+        return str(last_order_id if last_order_id is not None else "").encode("ascii")
+
+    def _rails(self) -> Dict[str, Neighbours]:
+        return {
+            "boughtTogether": self._bought_together,
+            "sameAuthor": self._same_author,
+            "samePublisher": self._same_publisher
+        }
+
+    def _load_shared(self, last_order_id: Optional[int]) -> bool:
+        """
+        Adopt the build another worker published for these orders
+
+        Before its first build a worker also takes an older one, better
+        than empty rails, and rebuilds or reloads on the next poll.
+        """
+        try:
+            shared = self._shared.hgetall(SHARED_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Shared related items unavailable: {str(e)}")
+            return False
+        current = shared.get(b"orderId") == self._order_key(last_order_id)
+        if not shared or (self.ready and not current):
+            return False
+        rails = {
+            rail: Neighbours.load(shared[f"{rail}:offsets".encode()], shared[f"{rail}:ids".encode()])
+            for rail in self._rails()
+        }
+        with self._lock:
+            self._bought_together = rails["boughtTogether"]
+            self._same_author = rails["sameAuthor"]
+            self._same_publisher = rails["samePublisher"]
+            self._last_order_id = last_order_id if current else None
+            self._built_at = time.monotonic() if current else 0.0
+            self.ready = True
+        logger.info(f"Related items loaded from the shared build, {self.nbytes() / 1048576:.1f} MiB")
+        return current
+
+    def _claim_build(self) -> bool:
+        try:
+            return bool(self._shared.set(BUILD_LOCK_KEY, 1, nx=True, ex=BUILD_LOCK_SECONDS))
+        except redis.RedisError as e:
+            logger.warning(f"Shared related items unavailable, building locally: {str(e)}")
+            return True
+
+    def _release_build(self) -> None:
+        try:
+            self._shared.delete(BUILD_LOCK_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Shared related items unavailable: {str(e)}")
+
+    def _publish(self) -> None:
+        mapping = {"orderId": self._order_key(self._last_order_id)}
+        for rail, neighbours in self._rails().items():
+            mapping[f"{rail}:offsets"], mapping[f"{rail}:ids"] = neighbours.dump()
+        try:
+            self._shared.hset(SHARED_KEY, mapping=mapping)
+        except redis.RedisError as e:
+            logger.warning(f"Shared related items unavailable: {str(e)}")
+
+    @staticmethod
+    def _co_occurrence(db: Session, active: Dict[int, int]) -> Dict[int, List[int]]:
+        """Top co-purchased products per product, by cosine similarity."""
+        since = datetime.now() - timedelta(days=ORDER_LOOKBACK_DAYS)
+        orders: Dict[int, int] = {}
+        pairs: Dict[int, int] = {}  # a << 32 | b, a < b -> orders containing both
+
+        def count(basket: set) -> None:
+            if not 1 < len(basket) <= MAX_ORDER_ITEMS:
+                if len(basket) == 1:
+                    product_id = next(iter(basket))
+                    orders[product_id] = orders.get(product_id, 0) + 1
+                return
+            ordered = sorted(basket)
+            for i, a in enumerate(ordered):
+                orders[a] = orders.get(a, 0) + 1
+                for b in ordered[i + 1:]:
+                    key = a << 32 | b
+                    pairs[key] = pairs.get(key, 0) + 1
+
+        # Streamed in order_id order so each basket is complete when the next begins;
+        # order_status_id 0 marks checkouts that were never confirmed
+        current_order = None
+        basket: set = set()
+        for order_id, product_id in db.query(models.OrderProduct.order_id, models.OrderProduct.product_id).join(
+            models.Order, models.Order.order_id == models.OrderProduct.order_id
+        ).filter(
+            models.Order.order_status_id > 0,
+            models.Order.date_added >= since
+        ).order_by(models.OrderProduct.order_id).yield_per(10000):
+            if order_id != current_order:
+                count(basket)
+                current_order = order_id
+                basket = set()
+            if product_id in active:
+                basket.add(product_id)
+        count(basket)
+
+        scored: Dict[int, List[Tuple[float, int]]] = {}
+        for key, together in pairs.items():
+            if together < MIN_CO_ORDERS:
+                continue
+            a, b = key >> 32, key & 0xFFFFFFFF
+            score = together / math.sqrt(orders[a] * orders[b])
+            for product_id, other in ((a, b), (b, a)):
+                heap = scored.setdefault(product_id, [])
+                if len(heap) < TOP_N:
+                    heapq.heappush(heap, (score, -other))
+                elif (score, -other) > heap[0]:
+                    heapq.heapreplace(heap, (score, -other))
+        return {
+            product_id: [-negated for _, negated in sorted(heap, reverse=True)]
+            for product_id, heap in scored.items()
+        }
+
+    def related(self, product_id: int, limit: int = TOP_N) -> Dict[str, List[int]]:
+        """Neighbour product ids per rail, best first."""
+        with self._lock:
+            return {
+                "boughtTogether": self._bought_together.get(product_id, limit),
+                "sameAuthor": self._same_author.get(product_id, limit),
+                "samePublisher": self._same_publisher.get(product_id, limit)
+            }
+
+
+related_items = RelatedItems(shared_url=settings.ITEM_CACHE_REDIS_URL)
@@ -0,0 +1,405 @@
+"""
+In-process inverted index over the product catalog for /items/search.
+
+The index is built from the default-language rows of oc_product_description
+(name, meta_keyword, description), the linked author names and
+oc_product.model/sku, and is kept current by re-indexing products whose
+date_modified moved past the last watermark. A periodic full rebuild picks
+up deletions and author re-linking.
+
+Postings carry a precomputed BM25F weight per (term, product) so
+sort_by=relevance can rank a match set without going back to MySQL.
+
+Name and author terms are also held in a FuzzyIndex, which search() and
+rank() consult with fuzzy=True to match misspelt or romanised queries.
+"""
+import bisect
+import heapq
+import html
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.fuzzy_index import FuzzyIndex
+
+logger = logging.getLogger(__name__)
+
+# \w alone splits Tamil words at every vowel sign (category Mc/Mn), so the
+# combining-mark and Indic blocks are added explicitly.
+_TOKEN_RE = re.compile(r"[\w\u0300-\u036f\u0900-\u0dff]+")
+_TAG_RE = re.compile(r"<[^>]*>")
+
+# BM25F parameters: per-field boost and length normalisation
+K1 = 1.2
+FIELD_WEIGHTS = {"name": 3.0, "author": 2.5, "meta_keyword": 1.5, "code": 1.0, "description": 0.5}
+FIELD_B = {"name": 0.5, "author": 0.3, "meta_keyword": 0.5, "code": 0.0, "description": 0.75}
+# Score added per log1p(Product.viewed)
+POPULARITY_WEIGHT = 0.3
+# Discount for terms matched only as a completion of the last query token
+PREFIX_MATCH_FACTOR = 0.5
+# Discount per edit for terms matched by spelling similarity
+FUZZY_MATCH_FACTOR = 0.5
+# Fields whose terms can be matched by spelling similarity
+FUZZY_FIELDS = ("name", "author")
+# Saturated weights lie in [0, K1 + 1) and are stored scaled to ints below
+# 256, which CPython shares, so a posting costs only its dict slot.
+WEIGHT_SCALE = 100
+
+
+def normalize(text: str) -> str:
+    """NFC-normalise and case-fold text so Unicode variants compare equal."""
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text into search tokens
+
+    Args:
+        text: Raw text, possibly containing (escaped) HTML
+
+    Returns:
+        List of normalised tokens in order of appearance
+    """
+    if not text:
+        return []
+    text = _TAG_RE.sub(" ", html.unescape(text))
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class Document(NamedTuple):
+    """A product as seen by the index, keyed by FIELD_WEIGHTS field name."""
+    product_id: int
+    active: bool
+    viewed: int
+    date_modified: Optional[datetime]
+    fields: Dict[str, Optional[str]]
+
+
+class SearchIndex:
+    """
+    Token -> {product_id: weight} postings with prefix matching on the last
+    query token and BM25F top-k ranking.
+    """
+
+    def __init__(self, full_rebuild_interval: float = 6 * 60 * 60):
+        self.full_rebuild_interval = full_rebuild_interval
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._vocabulary: List[str] = []
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._viewed: Dict[int, int] = {}
+        self._avg_lengths: Dict[str, float] = {}
+        self._fuzzy = FuzzyIndex()
+        self._watermark: Optional[datetime] = None
+        self._built_viewed = 0
+        self._built_at = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    @property
+    def signature(self) -> Tuple:
+        """
+        Identifies the indexed content for HTTP validators
+
+        Incremental updates move the watermark; a full rebuild can also
+        change popularity, which the view total at build time captures.
+        """
+        return (self._watermark, len(self._doc_terms), self._built_viewed)
+
+    # Loading
+
+    def _load_documents(self, db: Session, since: Optional[datetime] = None) -> Iterator[Document]:
+        query = db.query(
+            models.Product.product_id,
+            models.Product.status,
+            models.Product.viewed,
+            models.Product.date_modified,
+            models.Product.model,
+            models.Product.sku,
+            models.ProductDescription.name,
+            models.ProductDescription.meta_keyword,
+            models.ProductDescription.description
+        ).join(
+            models.ProductDescription,
+            and_(
+                models.Product.product_id == models.ProductDescription.product_id,
+                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        )
+        if since is None:
+            # Authors are read first: the product rows are streamed and the
+            # connection cannot run a second statement until they are drained.
+            authors = self._load_authors(db, None)
+            rows = query.filter(models.Product.status == 1).yield_per(2000)
+        else:
+            # >= so rows written in the same second as the watermark are not missed
+            rows = query.filter(models.Product.date_modified >= since).all()
+            authors = self._load_authors(db, [row.product_id for row in rows])
+        for row in rows:
+            yield Document(
+                product_id=row.product_id,
+                active=bool(row.status),
+                viewed=row.viewed or 0,
+                date_modified=row.date_modified,
+                fields={
+                    "name": row.name,
+                    "author": " ".join(authors.get(row.product_id, ())),
+                    "meta_keyword": row.meta_keyword,
+                    "code": f"{row.model or ''} {row.sku or ''}",
+                    "description": row.description
+                }
+            )
+
+    @staticmethod
+    def _load_authors(db: Session, product_ids: Optional[List[int]]) -> Dict[int, List[str]]:
+        if product_ids is not None and not product_ids:
+            return {}
+        query = db.query(models.ProductAuthor.product_id, models.Author.name).join(
+            models.Author, models.Author.author_id == models.ProductAuthor.author_id
+        ).filter(models.Author.status == True)
+        if product_ids is not None:
+            query = query.filter(models.ProductAuthor.product_id.in_(product_ids))
+        authors: Dict[int, List[str]] = {}
+        try:
+            for product_id, name in query:
+                authors.setdefault(product_id, []).append(name)
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Search index built without author names: {str(e)}")
+        return authors
+
+    # Building
+
+    @staticmethod
+    def _field_tokens(document: Document) -> Dict[str, List[str]]:
+        return {field: tokenize(document.fields.get(field)) for field in FIELD_WEIGHTS}
+
+    def _weigh(self, field_tokens: Dict[str, List[str]], avg_lengths: Dict[str, float]) -> Dict[str, int]:
+        """BM25F: combine length-normalised field frequencies, then saturate."""
+        combined: Dict[str, float] = {}
+        for field, tokens in field_tokens.items():
+            if not tokens:
+                continue
+            b = FIELD_B[field]
+            norm = 1 - b + b * len(tokens) / (avg_lengths.get(field) or 1.0)
+            boost = FIELD_WEIGHTS[field] / norm
+            for term, tf in Counter(tokens).items():
+                combined[term] = combined.get(term, 0.0) + tf * boost
+        return {
+            term: max(1, int(WEIGHT_SCALE * tf * (K1 + 1) / (K1 + tf)))
+            for term, tf in combined.items()
+        }
+
+    def build(self, documents: Iterable[Document]) -> None:
+        """Build a fresh index from the given active documents and swap it in."""
+        tokenized = []
+        totals: Dict[str, int] = dict.fromkeys(FIELD_WEIGHTS, 0)
+        fuzzy_terms: Set[str] = set()
+        watermark = None
+        for document in documents:
+            if not document.active:
+                continue
+            field_tokens = self._field_tokens(document)
+            for field, tokens in field_tokens.items():
+                totals[field] += len(tokens)
+            for field in FUZZY_FIELDS:
+                fuzzy_terms.update(field_tokens[field])
+            tokenized.append((document.product_id, document.viewed, field_tokens))
+            if document.date_modified and (watermark is None or document.date_modified > watermark):
+                watermark = document.date_modified
+        avg_lengths = {field: total / max(1, len(tokenized)) for field, total in totals.items()}
+
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_terms: Dict[int, Tuple[str, ...]] = {}
+        viewed: Dict[int, int] = {}
+        for product_id, product_viewed, field_tokens in tokenized:
+            weights = self._weigh(field_tokens, avg_lengths)
+            for term, weight in weights.items():
+                postings.setdefault(term, {})[product_id] = weight
+            doc_terms[product_id] = tuple(weights)
+            viewed[product_id] = product_viewed
+        self._fuzzy.build(fuzzy_terms)
+
+        with self._lock:
+            self._postings = postings
+            self._doc_terms = doc_terms
+            self._viewed = viewed
+            self._avg_lengths = avg_lengths
+            self._vocabulary = sorted(postings)
+            self._watermark = watermark
+            self._built_viewed = sum(viewed.values())
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Search index built: {len(doc_terms)} products, {len(postings)} terms")
+
+    def _remove(self, product_id: int) -> None:
+        self._viewed.pop(product_id, None)
+        for term in self._doc_terms.pop(product_id, ()):
+            ids = self._postings.get(term)
+            if ids is None:
+                continue
+            ids.pop(product_id, None)
+            if not ids:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocabulary, term)
+                if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                    del self._vocabulary[i]
+
+    def apply(self, documents: Iterable[Document]) -> None:
+        """Re-index changed documents in place, dropping inactive ones."""
+        with self._lock:
+            for document in documents:
+                self._remove(document.product_id)
+                if document.active:
+                    field_tokens = self._field_tokens(document)
+                    weights = self._weigh(field_tokens, self._avg_lengths)
+                    for term, weight in weights.items():
+                        if term not in self._postings:
+                            bisect.insort(self._vocabulary, term)
+                            self._postings[term] = {}
+                        self._postings[term][document.product_id] = weight
+                    self._doc_terms[document.product_id] = tuple(weights)
+                    self._viewed[document.product_id] = document.viewed
+                    for field in FUZZY_FIELDS:
+                        self._fuzzy.add(field_tokens[field])
+                if document.date_modified and (self._watermark is None or document.date_modified > self._watermark):
+                    self._watermark = document.date_modified
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when stale, otherwise apply incremental changes."""
+        if not self.ready or time.monotonic() - self._built_at >= self.full_rebuild_interval:
+            self.rebuild(db)
+        else:
+            self.update(db)
+
+    def rebuild(self, db: Session) -> None:
+        """Build a fresh index from every active product."""
+        self.build(self._load_documents(db))
+
+    def update(self, db: Session) -> None:
+        """Re-index products modified since the last watermark."""
+        if self._watermark is None:
+            self.rebuild(db)
+        else:
+            self.apply(list(self._load_documents(db, since=self._watermark)))
+
+    # Querying
+
+    def _expand_prefix(self, prefix: str) -> Iterable[str]:
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            yield self._vocabulary[i]
+            i += 1
+
+    def _query_terms(self, tokens: List[str], fuzzy: bool = False) -> List[Dict[str, float]]:
+        """
+        Index terms each query token matches, with their score factor
+
+        The last token is a prefix. With fuzzy, every token also matches
+        terms whose spelling or transliteration is close to it.
+        """
+        terms: List[Dict[str, float]] = []
+        for i, token in enumerate(tokens):
+            token_terms: Dict[str, float] = {}
+            if fuzzy:
+                for term, distance in self._fuzzy.similar(token):
+                    if term in self._postings:
+                        token_terms[term] = FUZZY_MATCH_FACTOR ** distance
+            if i == len(tokens) - 1:
+                for term in self._expand_prefix(token):
+                    token_terms.setdefault(term, 1.0 if term == token else PREFIX_MATCH_FACTOR)
+            elif token in self._postings:
+                token_terms[token] = 1.0
+            terms.append(token_terms)
+        return terms
+
+    def search(self, q: str, fuzzy: bool = False) -> Optional[Set[int]]:
+        """
+        Find products containing every token of the query
+
+        The last token is treated as a prefix so partially typed words match.
+
+        Args:
+            q: Raw search keyword
+            fuzzy: Also match misspelt and transliterated tokens
+
+        Returns:
+            Set of matching product ids, or None if the index cannot answer
+            (not built yet, or the query has no indexable tokens)
+        """
+        if not self.ready:
+            return None
+        tokens = tokenize(q)
+        if not tokens:
+            return None
+        with self._lock:
+            result: Optional[Set[int]] = None
+            for token_terms in self._query_terms(tokens, fuzzy):
+                ids: Set[int] = set()
+                for term in token_terms:
+                    ids.update(self._postings[term])
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result
+
+    def rank(self, q: str, product_ids: Iterable[int], limit: int, fuzzy: bool = False) -> List[int]:
+        """
+        Return the `limit` best-scoring products among `product_ids`
+
+        Scores are BM25F over the indexed fields plus a log-scaled
+        popularity prior from Product.viewed. Each posting list is walked
+        from its smaller side against the candidates, and only a heap of
+        `limit` entries is kept, so the match set is never sorted.
+
+        Args:
+            q: Raw search keyword
+            product_ids: Candidate products (normally a filtered search() result)
+            limit: Number of results wanted
+            fuzzy: Score the terms search(q, fuzzy=True) matched on
+
+        Returns:
+            Product ids, best first; ties go to the higher product_id
+        """
+        candidates = product_ids if isinstance(product_ids, (set, frozenset)) else set(product_ids)
+        tokens = tokenize(q)
+        with self._lock:
+            total = max(1, len(self._doc_terms))
+            scores: Dict[int, float] = {}
+            for token_terms in self._query_terms(tokens, fuzzy) if tokens else []:
+                for term, factor in token_terms.items():
+                    ids = self._postings[term]
+                    idf = factor * math.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5)) / WEIGHT_SCALE
+                    if len(ids) < len(candidates):
+                        for product_id, weight in ids.items():
+                            if product_id in candidates:
+                                scores[product_id] = scores.get(product_id, 0.0) + idf * weight
+                    else:
+                        for product_id in candidates:
+                            weight = ids.get(product_id)
+                            if weight:
+                                scores[product_id] = scores.get(product_id, 0.0) + idf * weight
+            viewed = self._viewed
+
+            def score(product_id: int) -> Tuple[float, int]:
+                prior = POPULARITY_WEIGHT * math.log1p(viewed.get(product_id, 0))
+                return scores.get(product_id, 0.0) + prior, product_id
+
+            return heapq.nlargest(limit, candidates, key=score)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,324 @@
+"""
+In-memory prefix index for search-box typeahead (/items/suggest).
+
+Product names, author, publisher and category names are stored as sorted
+keys, one per word position so "selv" finds "Ponniyin Selvan", and looked
+up with bisect. A max-score tree over the key array ranks a prefix's key
+range by popularity without visiting every key in it, so a one-letter
+prefix spanning much of the catalog is as cheap as a long one. Products
+are refreshed incrementally from oc_product.date_modified; the smaller
+author/publisher/category sets are reloaded on full rebuilds.
+"""
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Keys are generated for at most this many leading word positions, and cut
+# to this many characters, to bound memory for long titles
+MAX_KEY_WORDS = 6
+MAX_KEY_LENGTH = 64
+# Maximum suggestions a request may ask for
+TOP_K = 20
+# Sorts after every other character, closing a prefix range
+_RANGE_END = "\U0010ffff"
+
+
+class Suggestion(NamedTuple):
+    kind: str  # ITEM, AUTHOR, PUBLISHER, CATEGORY
+    id: int
+    name: str
+    score: float
+    item_id: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        filters = {"AUTHOR": "authorId", "PUBLISHER": "publisherId", "CATEGORY": "categoryId"}
+        return {
+            "name": self.name,
+            "suggestionType": self.kind,
+            "itemId": self.item_id,
+            "searchFilter": f"{filters[self.kind]}={self.id}" if self.kind in filters else None
+        }
+
+
+def suggestion_keys(name: Optional[str]) -> List[str]:
+    """Normalised keys for a name, one starting at each leading word."""
+    tokens = tokenize(name)
+    return [" ".join(tokens[i:])[:MAX_KEY_LENGTH] for i in range(min(len(tokens), MAX_KEY_WORDS))]
+
+
+def _score_tree(entries: List[Optional[Suggestion]], key_entries: List[int]) -> array:
+    """
+    Max-score tree over the key array
+
+    Leaves hold the score of each key's entry, padded with -inf to a power
+    of two; node n holds the larger of nodes 2n and 2n + 1.
+    """
+    size = 1
+    while size < len(key_entries):
+        size *= 2
+    tree = array("d", [-math.inf]) * (2 * size)
+    tree[size:size + len(key_entries)] = array("d", (entries[entry_index].score for entry_index in key_entries))
+    for node in range(size - 1, 0, -1):
+        left, right = tree[2 * node], tree[2 * node + 1]
+        tree[node] = left if left >= right else right
+    return tree
+
+
+def _top(tree: array, key_entries: List[int], lo: int, hi: int, limit: int) -> List[int]:
+    """
+    The highest-scoring distinct entries behind keys[lo:hi], best first
+
+    The range is split into O(log n) tree nodes, which are expanded best
+    first, so only the paths to the returned keys are visited.
+    """
+    size = len(tree) // 2
+    heap: List[Tuple[float, int]] = []
+    left, right = lo + size, hi + size
+    while left < right:
+        if left & 1:
+            heap.append((-tree[left], left))
+            left += 1
+        if right & 1:
+            right -= 1
+            heap.append((-tree[right], right))
+        left //= 2
+        right //= 2
+    heapq.heapify(heap)
+    result: List[int] = []
+    seen: Set[int] = set()
+    while heap and len(result) < limit:
+        _, node = heapq.heappop(heap)
+        if node >= size:
+            # An entry has one key per leading word, several of which may share the prefix
+            entry_index = key_entries[node - size]
+            if entry_index not in seen:
+                seen.add(entry_index)
+                result.append(entry_index)
+        else:
+            heapq.heappush(heap, (-tree[2 * node], 2 * node))
+            heapq.heappush(heap, (-tree[2 * node + 1], 2 * node + 1))
+    return result
+
+
+class SuggestIndex:
+    """Sorted keys -> suggestion entries, ranked by popularity."""
+
+    def __init__(self, full_rebuild_interval: float = 6 * 60 * 60):
+        self.full_rebuild_interval = full_rebuild_interval
+        self._lock = threading.RLock()
+        self._keys: List[str] = []
+        self._key_entries: List[int] = []
+        self._entries: List[Optional[Suggestion]] = []
+        self._product_entries: Dict[int, int] = {}
+        self._tree = _score_tree([], [])
+        self._watermark: Optional[datetime] = None
+        self._seen_at_watermark: Set[Tuple[int, datetime]] = set()
+        self._built_at = 0.0
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def refresh(self, db: Session) -> None:
+        """Rebuild when stale, otherwise apply incremental product changes."""
+        if not self.ready or time.monotonic() - self._built_at >= self.full_rebuild_interval:
+            self.rebuild(db)
+        else:
+            self.update(db)
+
+    # Loading
+
+    @staticmethod
+    def _product_query(db: Session):
+        return db.query(
+            models.Product.product_id,
+            models.Product.status,
+            models.Product.viewed,
+            models.Product.date_modified,
+            models.ProductDescription.name
+        ).join(
+            models.ProductDescription,
+            and_(
+                models.Product.product_id == models.ProductDescription.product_id,
+                models.ProductDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        )
+
+    @staticmethod
+    def _item_ids(db: Session, product_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        query = db.query(models.OneItems.oc_id, func.min(models.OneItems.id)).group_by(models.OneItems.oc_id)
+        if product_ids is not None:
+            query = query.filter(models.OneItems.oc_id.in_(product_ids))
+        return dict(query)
+
+    @staticmethod
+    def _popularity(db: Session, link_product_column, link_value_column) -> Dict[int, int]:
+        """Total views of the active products linked to each value."""
+        return dict(
+            db.query(link_value_column, func.sum(models.Product.viewed)).join(
+                models.Product, models.Product.product_id == link_product_column
+            ).filter(models.Product.status == 1).group_by(link_value_column)
+        )
+
+    def _load_entries(self, db: Session) -> Tuple[List[Suggestion], Optional[datetime]]:
+        entries: List[Suggestion] = []
+        watermark = None
+        item_ids = self._item_ids(db)
+        for row in self._product_query(db).filter(models.Product.status == 1):
+            if row.name:
+                entries.append(Suggestion(
+                    "ITEM", row.product_id, row.name, math.log1p(row.viewed or 0),
+                    item_ids.get(row.product_id, row.product_id)
+                ))
+            if row.date_modified and (watermark is None or row.date_modified > watermark):
+                watermark = row.date_modified
+
+        popularity = self._popularity(db, models.ProductAuthor.product_id, models.ProductAuthor.author_id)
+        for author_id, name in db.query(models.Author.author_id, models.Author.name).filter(models.Author.status == True):
+            entries.append(Suggestion("AUTHOR", author_id, name, math.log1p(popularity.get(author_id) or 0)))
+
+        popularity = self._popularity(db, models.ProductPublisher.product_id, models.ProductPublisher.publisher_id)
+        for publisher_id, name in db.query(models.Publisher.publisher_id, models.Publisher.name).filter(models.Publisher.status == True):
+            entries.append(Suggestion("PUBLISHER", publisher_id, name, math.log1p(popularity.get(publisher_id) or 0)))
+
+        popularity = self._popularity(db, models.ProductToCategory.product_id, models.ProductToCategory.category_id)
+        for category_id, name in db.query(models.Category.category_id, models.CategoryDescription.name).join(
+            models.CategoryDescription,
+            and_(
+                models.Category.category_id == models.CategoryDescription.category_id,
+                models.CategoryDescription.language_id == 1  # Assuming language_id 1 is default
+            )
+        ).filter(models.Category.status == True):
+            if name:
+                entries.append(Suggestion("CATEGORY", category_id, name, math.log1p(popularity.get(category_id) or 0)))
+        return entries, watermark
+
+    # Building
+
+    def rebuild(self, db: Session) -> None:
+        """Build a fresh index and swap it in."""
+        entries, watermark = self._load_entries(db)
+        pairs = sorted(
+            (key, entry_index)
+            for entry_index, entry in enumerate(entries)
+            for key in set(suggestion_keys(entry.name))
+        )
+        keys = [key for key, _ in pairs]
+        key_entries = [entry_index for _, entry_index in pairs]
+        tree = _score_tree(entries, key_entries)
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._key_entries = key_entries
+            self._product_entries = {
+                entry.id: entry_index for entry_index, entry in enumerate(entries) if entry.kind == "ITEM"
+            }
+            self._tree = tree
+            self._watermark = watermark
+            self._seen_at_watermark = set()
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info(f"Suggest index built: {len(entries)} entries, {len(keys)} keys")
+
+    def update(self, db: Session) -> None:
+        """Re-index products modified since the last watermark."""
+        if self._watermark is None:
+            return
+        # >= so rows written in the same second as the watermark are not missed;
+        # rows already applied at that second are skipped
+        rows = self._product_query(db).filter(models.Product.date_modified >= self._watermark).all()
+        if not rows:
+            return
+        changed = [row for row in rows if (row.product_id, row.date_modified) not in self._seen_at_watermark]
+        watermark = max(row.date_modified for row in rows)
+        seen = {(row.product_id, row.date_modified) for row in rows if row.date_modified == watermark}
+        if not changed:
+            with self._lock:
+                self._watermark = watermark
+                self._seen_at_watermark = seen
+            return
+        item_ids = self._item_ids(db, [row.product_id for row in changed])
+
+        # The new index is built on copies without the lock (the refresher is
+        # the only writer) and swapped in whole. A product keeps its entry slot.
+        entries = list(self._entries)
+        product_entries = dict(self._product_entries)
+        dropped: Set[int] = set()
+        added: List[Tuple[str, int]] = []
+        for row in changed:
+            entry_index = product_entries.pop(row.product_id, None)
+            if entry_index is not None:
+                dropped.add(entry_index)
+                entries[entry_index] = None
+            if row.status and row.name:
+                if entry_index is None:
+                    entry_index = len(entries)
+                    entries.append(None)
+                entries[entry_index] = Suggestion(
+                    "ITEM", row.product_id, row.name, math.log1p(row.viewed or 0),
+                    item_ids.get(row.product_id, row.product_id)
+                )
+                product_entries[row.product_id] = entry_index
+                added.extend((key, entry_index) for key in set(suggestion_keys(row.name)))
+        added.sort()
+
+        # One merge pass drops the old keys of changed products and adds the new ones
+        keys: List[str] = []
+        key_entries: List[int] = []
+        kept = ((key, entry_index) for key, entry_index in zip(self._keys, self._key_entries) if entry_index not in dropped)
+        for key, entry_index in heapq.merge(kept, added):
+            keys.append(key)
+            key_entries.append(entry_index)
+        # Key positions moved, so the tree is rebuilt in the same linear pass
+        tree = _score_tree(entries, key_entries)
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._key_entries = key_entries
+            self._product_entries = product_entries
+            self._tree = tree
+            self._watermark = watermark
+            self._seen_at_watermark = seen
+
+    # Querying
+
+    def suggest(self, q: str, limit: int = 10) -> Optional[List[Suggestion]]:
+        """
+        Most popular names starting with the typed text at a word boundary
+
+        Args:
+            q: Text typed so far
+            limit: Maximum suggestions (at most TOP_K)
+
+        Returns:
+            Suggestions, best first, or None if the index is not built yet
+        """
+        if not self.ready:
+            return None
+        prefix = " ".join(tokenize(q))[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + _RANGE_END)
+            entry_indexes = _top(self._tree, self._key_entries, lo, hi, limit)
+            return [self._entries[entry_index] for entry_index in entry_indexes]
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,77 @@
+"""
+Benchmark for the typo- and transliteration-tolerant term index.
+
+Builds a FuzzyIndex over a synthetic vocabulary of Tamil and Latin words and
+reports build time, memory, lookup latency and recall for two kinds of
+query: a romanised spelling of a Tamil word, and a word with one random
+typo.
+
+Usage:
+    python -m benchmarks.fuzzy_search [--sizes 100000 500000] [--queries 1000]
+"""
+import argparse
+import random
+import resource
+import string
+import time
+
+from app.services.fuzzy_index import FuzzyIndex, transliterate
+from benchmarks.search_ranking import make_vocabulary
+
+
+def typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word))
+    edit = rng.choice(("delete", "insert", "replace"))
+    if edit == "delete" and len(word) > 3:
+        return word[:i] + word[i + 1:]
+    if edit == "insert":
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def measure(index: FuzzyIndex, queries) -> None:
+    found = 0
+    started = time.perf_counter()
+    for query, expected in queries:
+        if expected in (term for term, _ in index.similar(query)):
+            found += 1
+    elapsed = time.perf_counter() - started
+    print(f"    {1000 * elapsed / len(queries):.2f} ms/query, recall {100 * found / len(queries):.1f}%")
+
+
+def run(size: int, query_count: int) -> None:
+    rng = random.Random(size)
+    vocabulary = make_vocabulary(rng, size)
+    index = FuzzyIndex(max_keys=size)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index.build(vocabulary)
+    build_seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; growth of the peak includes build scratch space
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    tamil = [word for word in vocabulary if transliterate(word) != word]
+    latin = [word for word in vocabulary if transliterate(word) == word and len(word) >= 5]
+    romanised = [(transliterate(word), word) for word in rng.sample(tamil, min(query_count, len(tamil)))]
+    misspelt = [(typo(rng, word), word) for word in rng.sample(latin, min(query_count, len(latin)))]
+
+    print(f"terms={size:,} keys={len(index):,}")
+    print(f"  build: {build_seconds:.1f}s, peak RSS growth {rss_growth / 1024:.0f} MiB")
+    print("  romanised Tamil:")
+    measure(index, romanised)
+    print("  one typo:")
+    measure(index, misspelt)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark for the in-memory search index and sort_by=relevance ranking.
+
+Builds a synthetic catalog (Zipf-distributed vocabulary, Tamil and Latin
+words) directly into SearchIndex, without MySQL, and reports build time and
+per-query match + top-k ranking cost.
+
+Usage:
+    python -m benchmarks.search_ranking [--sizes 100000 1000000] [--queries 200]
+"""
+import argparse
+import bisect
+import itertools
+import random
+import resource
+import time
+from datetime import datetime
+
+from app.services.search_index import Document, SearchIndex
+
+TAMIL_SYLLABLES = ["க", "கா", "கி", "ப", "பொ", "ன்", "னி", "யி", "செ", "ல்", "வ", "ம", "மு", "த", "தி", "ரா", "லை", "நா"]
+LATIN_SYLLABLES = ["ka", "ra", "mo", "li", "se", "van", "thi", "ru", "na", "pa", "lo", "gi"]
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    words = set()
+    while len(words) < size:
+        syllables = TAMIL_SYLLABLES if rng.random() < 0.7 else LATIN_SYLLABLES
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))))
+    return sorted(words)
+
+
+def make_documents(rng: random.Random, count: int, vocabulary):
+    # Zipf-like: low ranks are common, the long tail is rare
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    total = cum_weights[-1]
+    authors = [" ".join(rng.choices(vocabulary, k=2)) for _ in range(max(1, count // 20))]
+    now = datetime.now()
+    for product_id in range(1, count + 1):
+        words = [vocabulary[bisect.bisect(cum_weights, rng.random() * total)] for _ in range(14)]
+        yield Document(
+            product_id=product_id,
+            active=True,
+            viewed=int(rng.paretovariate(1.2)) - 1,
+            date_modified=now,
+            fields={
+                "name": " ".join(words[:4]),
+                "author": rng.choice(authors),
+                "meta_keyword": " ".join(words[4:6]),
+                "code": f"M{product_id} SKU{product_id}",
+                "description": " ".join(words[6:])
+            }
+        )
+
+
+def run(size: int, query_count: int, page_size: int = 20) -> None:
+    rng = random.Random(size)
+    vocabulary = make_vocabulary(rng, 60000)
+    index = SearchIndex()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index.build(make_documents(rng, size, vocabulary))
+    build_seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; growth of the peak includes build scratch space
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    # Queries: a partially typed common word, or a full word plus a prefix
+    queries = []
+    for _ in range(query_count):
+        words = rng.choices(vocabulary[:300], k=2) if rng.random() < 0.3 else rng.choices(vocabulary[:3000], k=1)
+        queries.append(" ".join(words[:-1] + [words[-1][:max(2, len(words[-1]) - 2)]]))
+
+    match_sizes = []
+    search_seconds = 0.0
+    rank_seconds = 0.0
+    for q in queries:
+        started = time.perf_counter()
+        matched = index.search(q) or set()
+        search_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        index.rank(q, matched, page_size)
+        rank_seconds += time.perf_counter() - started
+        match_sizes.append(len(matched))
+
+    match_sizes.sort()
+    print(f"products={size:,}")
+    print(f"  build: {build_seconds:.1f}s, peak RSS growth {rss_growth / 1024:.0f} MiB")
+    print(f"  matches/query: median {match_sizes[len(match_sizes) // 2]:,}, p95 {match_sizes[int(len(match_sizes) * 0.95)]:,}")
+    print(f"  search: {1000 * search_seconds / query_count:.2f} ms/query")
+    print(f"  rank top-{page_size}: {1000 * rank_seconds / query_count:.2f} ms/query")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries)
+
+
+if __name__ == "__main__":
+    main()